@@ -4,9 +4,8 @@ import gradio as gr
 import glob
 import os
 from datetime import datetime
-from src.orchestrator import run_analysis
+from src.orchestrator import astream_analysis, configure_error_logging
 from src.problem_statement_optimizer import optimize_problem_statement
-import asyncio
 
 # Number of variations (simulations) to generate for the problem statement
 number_of_scenarios = 10
@@ -38,18 +37,45 @@ llm_config_4 = {
 
 output_directory = 'analysis_results'
 
-def analyze_problem(problem_description):
-    final_summary, model_diagram = asyncio.run(run_analysis(
-        problem_statement=problem_description,
-        num_variations=number_of_scenarios,
-        llm_for_generating_system_model=llm_config_1,
-        llm_for_generating_scenarios=llm_config_1,
-        llm_for_simulation_analysis=llm_config_2,
-        llm_for_summarization=llm_config_3,
-        output_directory=output_directory,
-        verbose=True
-    ))
-    return final_summary, model_diagram
+# Gradio concurrency settings: submissions processed at the same time, and worker threads for sync handlers
+queue_concurrency_limit = 10
+max_threads = 40
+
+# Enable/disable both buttons while processing
+def set_buttons_state(disabled):
+    return gr.update(interactive=not disabled), gr.update(interactive=not disabled)
+
+async def analyze_problem(problem_description):
+    # Disable the buttons and stream the results from a single queued event, instead of chaining
+    # separate disable/analyze/enable events that each pay a queue round-trip
+    yield *set_buttons_state(True), gr.update(), gr.update()
+    try:
+        # The diagram is shown as soon as the model is generated, the final summary as the LLM streams it
+        async for final_summary, model_diagram in astream_analysis(
+            problem_statement=problem_description,
+            num_variations=number_of_scenarios,
+            llm_for_generating_system_model=llm_config_1,
+            llm_for_generating_scenarios=llm_config_1,
+            llm_for_simulation_analysis=llm_config_2,
+            llm_for_summarization=llm_config_3,
+            output_directory=output_directory,
+            verbose=True
+        ):
+            yield *set_buttons_state(True), final_summary, model_diagram
+    except Exception as e:
+        yield *set_buttons_state(False), gr.update(), gr.update()
+        raise gr.Error(f"Analysis failed: {e}")
+    yield *set_buttons_state(False), gr.update(), gr.update()
+
+def optimize_problem(text):
+    # Optimize input and update textbox in place, buttons are disabled in the same event
+    yield *set_buttons_state(True), gr.update()
+    try:
+        optimized_text = optimize_problem_statement(text, llm_config_4)
+    except Exception as e:
+        yield *set_buttons_state(False), gr.update()
+        raise gr.Error(f"Optimization failed: {e}")
+    yield *set_buttons_state(False), optimized_text
 
 with gr.Blocks(title="Chronos - Simulation Tool") as demo:
     gr.HTML("""
@@ -84,54 +110,21 @@ with gr.Blocks(title="Chronos - Simulation Tool") as demo:
     output_md = gr.Markdown(label="Analysis", value=" ", visible=True, elem_id="output_md_box")
     
 
-    # Optimize button logic: optimize input and update textbox in place
-    def optimize_and_return(text):
-        return optimize_problem_statement(text, llm_config_4)
-
-    # Disable buttons while processing
-    def set_buttons_state(disabled):
-        return gr.update(interactive=not disabled), gr.update(interactive=not disabled)
-
-    # When optimize starts, disable both buttons
     optimize_btn.click(
-        fn=lambda: set_buttons_state(True),
-        inputs=None,
-        outputs=[optimize_btn, submit_btn],
-        queue=False
-    ).then(
-        fn=optimize_and_return,
+        fn=optimize_problem,
         inputs=problem_input,
-        outputs=problem_input,
-        queue=True
-    ).then(
-        fn=lambda: set_buttons_state(False),
-        inputs=None,
-        outputs=[optimize_btn, submit_btn],
-        queue=False
+        outputs=[optimize_btn, submit_btn, problem_input]
     )
 
-    # When submit starts, disable both buttons
     submit_btn.click(
-        fn=lambda: set_buttons_state(True),
-        inputs=None,
-        outputs=[optimize_btn, submit_btn],
-        queue=False
-    # ).then(
-    #     fn=lambda: "\u23F3 Processing... Please wait.",
-    #     inputs=None,
-    #     outputs=None,
-    #     queue=False
-    ).then(
         fn=analyze_problem,
         inputs=problem_input,
-        outputs=[output_md, mermaid_md],
-        queue=True
-    ).then(
-        fn=lambda: set_buttons_state(False),
-        inputs=None,
-        outputs=[optimize_btn, submit_btn],
-        queue=False
+        outputs=[optimize_btn, submit_btn, output_md, mermaid_md],
+        concurrency_limit=queue_concurrency_limit
     )
-    
+
+demo.queue(default_concurrency_limit=queue_concurrency_limit, status_update_rate='auto', api_open=False)
+
 if __name__ == "__main__":
-    demo.launch()
+    configure_error_logging()
+    demo.launch(max_threads=max_threads)
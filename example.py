@@ -35,12 +35,14 @@ llm_config_3 = {
 output_directory = 'analysis_results'
 
 # Run the analysis with the specified parameters
-asyncio.run(run_analysis(
-    problem_statement=problem_description,
-    num_variations=number_of_scenarios,
-    llm_for_generating_system_model=llm_config_1,
-    llm_for_generating_scenarios=llm_config_1,
-    llm_for_simulation_analysis=llm_config_2,
-    llm_for_summarization=llm_config_3,
-    output_directory=output_directory
-))
+# The guard keeps simulation worker processes, which import this module, from starting the analysis again
+if __name__ == "__main__":
+    asyncio.run(run_analysis(
+        problem_statement=problem_description,
+        num_variations=number_of_scenarios,
+        llm_for_generating_system_model=llm_config_1,
+        llm_for_generating_scenarios=llm_config_1,
+        llm_for_simulation_analysis=llm_config_2,
+        llm_for_summarization=llm_config_3,
+        output_directory=output_directory
+    ))
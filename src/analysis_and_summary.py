@@ -2,159 +2,226 @@
 import pandas as pd
 import numpy as np
 import json
-import os
+import orjson
+import asyncio
+import itertools
+import warnings
 from dotenv import load_dotenv
 # from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda
+from langchain_core.utils.json import parse_json_markdown
 import logging
-from src.utils import load_prompt_from_file, select_llm_model
+from src.utils import load_prompt_template, select_llm_model
+from src.llm_cache import acached_invoke, acached_batch, acached_stream
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
-# Helper to convert NumPy types to Python native types recursively
-def convert_to_python_native(obj):
-    numpy_scalar_types = (np.integer, np.floating)
-    if isinstance(obj, numpy_scalar_types):
-        return obj.item() # Convert NumPy scalar to Python int/float
-    if isinstance(obj, dict):
-        return {k: convert_to_python_native(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [convert_to_python_native(elem) for elem in obj]
-    return obj
+# Output parsers are stateless, so like the prompts and LLM clients they are shared across calls
+_STR_OUTPUT_PARSER = StrOutputParser()
 
-def summarize_simulation_results_with_llm(
+def _parse_json_strictly(text: str):
+    # JsonOutputParser completes partial JSON, so a response cut off inside its last summary would still parse
+    # as a full array. json.loads rejects truncated or invalid JSON (a markdown code block around it is allowed)
+    return parse_json_markdown(text, parser=json.loads)
+
+_STRICT_JSON_OUTPUT_PARSER = _STR_OUTPUT_PARSER | RunnableLambda(_parse_json_strictly)
+
+# Marker left in summary_data for runs without results, and the summary returned for them without calling the LLM
+EMPTY_RESULTS_MESSAGE = "Simulation results DataFrame was empty."
+NO_DATA_SUMMARY = "The simulation produced no data, so there is nothing to summarize."
+
+# Upper bound on the parameters included in a scenario's summary data
+MAX_SUMMARY_PARAMETERS = 50
+
+TREND_LABELS = np.array(["decreased", "remained stable", "increased"])
+
+def _has_simulation_data(summary_data: dict) -> bool:
+    return summary_data.get("message") != EMPTY_RESULTS_MESSAGE
+
+def _numpy_json_default(obj):
+    # orjson serializes NumPy scalars and C-contiguous arrays natively, this only handles what it rejects
+    # (e.g. object dtype or non-contiguous arrays) without a conversion pre-pass over the whole payload
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def _dump_summary_data(summary_data: dict) -> str:
+    return orjson.dumps(
+        summary_data,
+        default=_numpy_json_default,
+        option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY
+    ).decode()
+
+_CANONICAL_PARAMETER_KEYS = {'value', 'unit', 'description'}
+
+def _ensure_value_unit(details, default_unit: str = "dimensionless") -> dict:
+    """Returns a parameter in {'value', 'unit', 'description'} shape, reusing the dict when it already has that shape."""
+    if isinstance(details, dict):
+        if details.keys() == _CANONICAL_PARAMETER_KEYS:
+            return details
+        return {
+            "value": details['value'] if 'value' in details else details,
+            "unit": details.get('unit', default_unit),
+            "description": details.get('description', '')
+        }
+    return {"value": details, "unit": default_unit, "description": ''}
+
+def normalize_model_parameters(model_parameters: dict) -> dict:
+    """
+    Brings every model parameter to the canonical {'value', 'unit', 'description'} shape.
+    Parameters given as plain values get a "dimensionless" unit and an empty description.
+    Parameters already in that shape (as generated from the ModelConfig schema) are reused, not copied.
+    """
+    return {name: _ensure_value_unit(details) for name, details in model_parameters.items()}
+
+def build_summary_data(
     problem_statement: str,
     simulation_results_df: pd.DataFrame,
     model_parameters: dict,
     stock_names: list,
     component_units: dict,
     time_unit: str,
-    llm_for_simulation_analysis: dict = {'provider': 'google', 'model_name': 'gemini-2.0-flash', 'temperature': 0.5},
     verbose: bool = False
-) -> str:
+) -> dict:
     """
-    Uses an LLM (Gemini) to summarize the simulation results in natural language.
-    Includes initial/final stock states, parameters, and their units for a more informed summary.
+    Collects the data the LLM summarizes for one simulation run:
+    initial/final stock states, parameters, per-column min/max/trend, all with their units.
+    model_parameters are expected in the shape returned by normalize_model_parameters.
     """
-    llm = select_llm_model(llm_for_simulation_analysis)
+    if simulation_results_df.empty:
+        return {
+            "problem_statement": problem_statement,
+            "message": EMPTY_RESULTS_MESSAGE
+        }
 
     summary_data = {}
-    if not simulation_results_df.empty:
-        # Extract initial and final stock values
-        initial_full_state = simulation_results_df.iloc[0].to_dict()
-        final_full_state = simulation_results_df.iloc[-1].to_dict()
+    # The results are converted to a NumPy array once (a view for the all-float frames the simulation produces),
+    # stock states and column statistics below index into it instead of selecting DataFrame columns
+    result_values = simulation_results_df.to_numpy()
+    column_positions = {col: i for i, col in enumerate(simulation_results_df.columns)}
+    first_row, last_row = result_values[0], result_values[-1]
 
-        initial_stock_state = {name: initial_full_state[name] for name in stock_names if name in initial_full_state}
-        final_stock_state = {name: final_full_state[name] for name in stock_names if name in final_full_state}
+    # Extract initial and final stock values
+    initial_stock_state = {name: first_row[column_positions[name]] for name in stock_names if name in column_positions}
+    final_stock_state = {name: last_row[column_positions[name]] for name in stock_names if name in column_positions}
 
-        # --- Display Initial and Final States (for console output) ---
-        if verbose:
-            print("\n--- Initial State of Stocks and Parameters ---")
-        for stock_name, value in initial_stock_state.items():
-            unit = component_units.get(stock_name, "units")
-            desc = None
+    # Resolve units and descriptions once per call instead of once per lookup
+    stock_units = {name: component_units.get(name, "units") for name in initial_stock_state}
+    column_units = {col: component_units.get(col, "unknown_unit") for col in simulation_results_df.columns}
+    # Normalized parameters keep a plain descriptions mapping under 'value'
+    stock_descriptions = model_parameters.get('stock_descriptions', {}).get('value', {})
+
+    # --- Display Initial and Final States (for console output and info logs) ---
+    # Built as one string and written once, and skipped entirely when nobody consumes it
+    if verbose or logger.isEnabledFor(logging.INFO):
+        def stock_line(stock_name, value):
             # Try to get description from model_parameters or stock definitions if available
-            if 'stock_descriptions' in model_parameters:
-                desc = model_parameters['stock_descriptions'].get(stock_name)
-            if verbose:
-                print(f"  {stock_name}: {value:.2f} {unit}" + (f" | {desc}" if desc else ""))
-        if verbose:
-            print("\n--- Initial Parameters ---")
-        for param_name, param_details in model_parameters.items():
-            value = param_details['value'] if isinstance(param_details, dict) and 'value' in param_details else param_details
-            unit = param_details['unit'] if isinstance(param_details, dict) and 'unit' in param_details else "dimensionless"
-            desc = param_details.get('description', None) if isinstance(param_details, dict) else None
-            if verbose:
-                print(f"  {param_name}: {value} {unit}" + (f" | {desc}" if desc else ""))
-        if verbose:
-            print("\n--- Final State of Stocks ---")
-        for stock_name, value in final_stock_state.items():
-            unit = component_units.get(stock_name, "units")
-            desc = None
-            if 'stock_descriptions' in model_parameters:
-                desc = model_parameters['stock_descriptions'].get(stock_name)
-            if verbose:
-                print(f"  {stock_name}: {value:.2f} {unit}" + (f" | {desc}" if desc else ""))
-            if verbose:
-                print("----------------------------------------------")
-        # --- End Display ---
-
-
-        # Populate summary_data for LLM (ensuring native Python types and including units and descriptions)
-        llm_parameters_with_units = {
-            name: {
-                "value": convert_to_python_native(details['value']) if isinstance(details, dict) and 'value' in details else convert_to_python_native(details),
-                "unit": details['unit'] if isinstance(details, dict) and 'unit' in details else "dimensionless",
-                "description": details.get('description', '') if isinstance(details, dict) else ''
-            } for name, details in model_parameters.items()
-        }
+            desc = stock_descriptions.get(stock_name)
+            return f"  {stock_name}: {value:.2f} {stock_units[stock_name]}" + (f" | {desc}" if desc else "")
 
-        llm_initial_stock_state = {
-            name: {
-                "value": convert_to_python_native(value),
-                "unit": component_units.get(name, "units"),
-                "description": model_parameters.get('stock_descriptions', {}).get(name, '')
-            } for name, value in initial_stock_state.items()
-        }
-        llm_final_stock_state = {
-            name: {
-                "value": convert_to_python_native(value),
-                "unit": component_units.get(name, "units"),
-                "description": model_parameters.get('stock_descriptions', {}).get(name, '')
-            } for name, value in final_stock_state.items()
-        }
+        def parameter_line(param_name, param_details):
+            desc = param_details['description']
+            return f"  {param_name}: {param_details['value']} {param_details['unit']}" + (f" | {desc}" if desc else "")
 
-        summary_data["model_parameters"] = llm_parameters_with_units
-        summary_data["initial_stock_state"] = llm_initial_stock_state
-        summary_data["final_stock_state"] = llm_final_stock_state
+        display_text = "\n".join([
+            "\n--- Initial State of Stocks and Parameters ---",
+            *[stock_line(name, value) for name, value in initial_stock_state.items()],
+            "\n--- Initial Parameters ---",
+            *[parameter_line(name, details) for name, details in model_parameters.items()],
+            "\n--- Final State of Stocks ---",
+            *[stock_line(name, value) for name, value in final_stock_state.items()],
+            "----------------------------------------------"
+        ])
+        if verbose:
+            print(display_text)
+        logger.info(display_text)
+    # --- End Display ---
 
-        summary_data["problem_statement"] = problem_statement
-        summary_data["simulation_duration"] = {
-            "value": convert_to_python_native(simulation_results_df['time'].max()),
-            "unit": time_unit
-        }
 
-        for col in simulation_results_df.columns:
-            if col != 'time':
-                col_unit = component_units.get(col, "unknown_unit")
-                summary_data[f"{col}_min"] = {"value": convert_to_python_native(simulation_results_df[col].min()), "unit": col_unit}
-                summary_data[f"{col}_max"] = {"value": convert_to_python_native(simulation_results_df[col].max()), "unit": col_unit}
-                if simulation_results_df[col].iloc[0] < simulation_results_df[col].iloc[-1]:
-                    summary_data[f"{col}_trend"] = "increased"
-                elif simulation_results_df[col].iloc[0] > simulation_results_df[col].iloc[-1]:
-                    summary_data[f"{col}_trend"] = "decreased"
-                else:
-                    summary_data[f"{col}_trend"] = "remained stable"
-    else:
-        summary_data = {
-            "problem_statement": problem_statement,
-            "message": "Simulation results DataFrame was empty."
-        }
+    # Populate summary_data for LLM (including units and descriptions), NumPy scalars are serialized natively by orjson
+    # Only the first MAX_SUMMARY_PARAMETERS parameters are sent, prompt size (and latency) grows with every entry
+    # Normalized parameters are already in the summary shape and are never mutated, so they are shared, not copied
+    llm_parameters_with_units = dict(itertools.islice(model_parameters.items(), MAX_SUMMARY_PARAMETERS))
+    if len(model_parameters) > MAX_SUMMARY_PARAMETERS:
+        llm_parameters_with_units['__elided__'] = f"{len(model_parameters) - MAX_SUMMARY_PARAMETERS} more parameters omitted"
 
+    llm_initial_stock_state = {
+        name: {
+            "value": value,
+            "unit": stock_units[name],
+            "description": stock_descriptions.get(name, '')
+        } for name, value in initial_stock_state.items()
+    }
+    llm_final_stock_state = {
+        name: {
+            "value": value,
+            "unit": stock_units[name],
+            "description": stock_descriptions.get(name, '')
+        } for name, value in final_stock_state.items()
+    }
 
-    # Load the prompt messages from the YAML file
-    prompt_directory = 'prompts'
-    if not os.path.exists(prompt_directory):
-        raise FileNotFoundError(f"Prompt directory not found: {prompt_directory}")
-    prompt_file = os.path.join(prompt_directory, 'sim_analysis_prompt.yaml')
-    prompt_messages = load_prompt_from_file(prompt_file)
+    summary_data["model_parameters"] = llm_parameters_with_units
+    summary_data["initial_stock_state"] = llm_initial_stock_state
+    summary_data["final_stock_state"] = llm_final_stock_state
 
-    prompt_template = ChatPromptTemplate.from_messages(
-        [
-            ("system", prompt_messages["system_message"]),
-            ("human", prompt_messages["human_message"])
-        ]
-    )
+    summary_data["problem_statement"] = problem_statement
+    summary_data["simulation_duration"] = {
+        "value": simulation_results_df['time'].max(),
+        "unit": time_unit
+    }
 
-    chain = prompt_template | llm | StrOutputParser()
+    # Reduce all columns of the array in one sweep per statistic, then keep the component (non-time) columns
+    component_columns = [col for col in simulation_results_df.columns if col != 'time']
+    component_positions = [column_positions[col] for col in component_columns]
+    # NaN-skipping reductions, matching pandas' min/max (an all-NaN column still yields NaN, without the warning)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        col_mins = np.nanmin(result_values, axis=0)[component_positions]
+        col_maxs = np.nanmax(result_values, axis=0)[component_positions]
+    first_values, last_values = first_row[component_positions], last_row[component_positions]
+    # Branchless trend lookup: sign of the change (-1, 0, 1) indexes the labels, NaN changes count as stable
+    trend_indices = np.nan_to_num(np.sign(last_values - first_values)).astype(int) + 1
+    trends = TREND_LABELS[trend_indices]
+    for col, col_min, col_max, trend in zip(component_columns, col_mins, col_maxs, trends):
+        col_unit = column_units[col]
+        summary_data[f"{col}_min"] = {"value": col_min, "unit": col_unit}
+        summary_data[f"{col}_max"] = {"value": col_max, "unit": col_unit}
+        summary_data[f"{col}_trend"] = str(trend)
+    return summary_data
+
+async def asummarize_summary_data_with_llm(
+    problem_statement: str,
+    summary_data: dict,
+    llm_for_simulation_analysis: dict = {'provider': 'google', 'model_name': 'gemini-2.0-flash', 'temperature': 0.5},
+    verbose: bool = False,
+    cache: bool | None = None
+) -> str:
+    """
+    Uses an LLM (Gemini) to summarize one simulation run from the data prepared by build_summary_data.
+    """
+    if not _has_simulation_data(summary_data):
+        logger.warning("Simulation results were empty, skipping the LLM summary.")
+        return NO_DATA_SUMMARY
+    # Serialize once up front, outside the LLM call and its error handling
+    inputs = {"problem_statement": problem_statement, "summary_data": _dump_summary_data(summary_data)}
+    llm = select_llm_model(llm_for_simulation_analysis)
+    prompt_template = load_prompt_template('sim_analysis_prompt.yaml')
+    chain = prompt_template | llm | _STR_OUTPUT_PARSER
 
     if verbose:
         print("\nSummarizing simulation results with LLM...")
     try:
-        response = chain.invoke({"problem_statement": problem_statement, "summary_data": json.dumps(summary_data, indent=2)})
+        response = await acached_invoke(
+            chain,
+            inputs,
+            llm_for_simulation_analysis,
+            cache=cache
+        )
         if verbose:
             print("\nLLM Summary Generated Successfully.")
         return response
@@ -162,47 +229,263 @@ def summarize_simulation_results_with_llm(
         logger.error(f"Error summarizing results with LLM: {e}")
         return "Failed to generate summary."
 
+async def asummarize_simulation_results_with_llm(
+    problem_statement: str,
+    simulation_results_df: pd.DataFrame,
+    model_parameters: dict,
+    stock_names: list,
+    component_units: dict,
+    time_unit: str,
+    llm_for_simulation_analysis: dict = {'provider': 'google', 'model_name': 'gemini-2.0-flash', 'temperature': 0.5},
+    verbose: bool = False,
+    cache: bool | None = None
+) -> str:
+    """
+    Uses an LLM (Gemini) to summarize the simulation results in natural language.
+    Includes initial/final stock states, parameters, and their units for a more informed summary.
+    Async variant so that several scenario summaries can be awaited concurrently.
+    Responses are cached on disk for low temperature configs; pass cache=True/False to override.
+    """
+    if simulation_results_df.empty:
+        logger.warning("Simulation results were empty, skipping the LLM summary.")
+        return NO_DATA_SUMMARY
+    summary_data = build_summary_data(
+        problem_statement,
+        simulation_results_df,
+        model_parameters=normalize_model_parameters(model_parameters),
+        stock_names=stock_names,
+        component_units=component_units,
+        time_unit=time_unit,
+        verbose=verbose
+    )
+    return await asummarize_summary_data_with_llm(
+        problem_statement,
+        summary_data,
+        llm_for_simulation_analysis=llm_for_simulation_analysis,
+        verbose=verbose,
+        cache=cache
+    )
+
+def _run_sync(coroutine):
+    """
+    Runs a coroutine of the async summary API to completion for the synchronous wrappers below.
+    asyncio.run cannot be nested, so called from a running event loop (an async Gradio handler, Jupyter)
+    this raises a RuntimeError naming the async function to await instead.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass # No running loop, the usual case for synchronous callers
+    else:
+        coroutine.close()
+        raise RuntimeError(
+            f"This synchronous wrapper cannot be called from a running event loop, await {coroutine.__qualname__}() instead."
+        )
+    return asyncio.run(coroutine)
+
+def summarize_simulation_results_with_llm(
+    problem_statement: str,
+    simulation_results_df: pd.DataFrame,
+    model_parameters: dict,
+    stock_names: list,
+    component_units: dict,
+    time_unit: str,
+    llm_for_simulation_analysis: dict = {'provider': 'google', 'model_name': 'gemini-2.0-flash', 'temperature': 0.5},
+    verbose: bool = False,
+    cache: bool | None = None
+) -> str:
+    """
+    Synchronous wrapper around asummarize_simulation_results_with_llm, kept for backward compatibility.
+    """
+    return _run_sync(asummarize_simulation_results_with_llm(
+        problem_statement,
+        simulation_results_df,
+        model_parameters=model_parameters,
+        stock_names=stock_names,
+        component_units=component_units,
+        time_unit=time_unit,
+        llm_for_simulation_analysis=llm_for_simulation_analysis,
+        verbose=verbose,
+        cache=cache
+    ))
+
+# Rough upper bound on the size of a fused multi-scenario prompt, larger batches are summarized one call per scenario
+MAX_BATCH_PROMPT_CHARS = 200_000
+
+async def asummarize_all_scenarios_with_llm(
+    problem_statement: str,
+    scenarios: list[dict],
+    llm_for_simulation_analysis: dict = {'provider': 'google', 'model_name': 'gemini-2.0-flash', 'temperature': 0.5},
+    verbose: bool = False,
+    cache: bool | None = None,
+    max_concurrency: int = 10
+) -> list[str]:
+    """
+    Summarizes several scenarios with a single LLM call that returns a JSON array of summaries.
+    Each scenario is a dict with 'scenario_description' and 'summary_data' (see build_summary_data).
+    Falls back to a batch of per-scenario calls (at most max_concurrency at a time) when the fused
+    prompt is too large or the LLM does not return exactly one summary per scenario.
+    """
+    if not scenarios:
+        return []
+
+    # Runs without results get the canned summary, only the others are sent to the LLM
+    indices_with_data = [i for i, scenario in enumerate(scenarios) if _has_simulation_data(scenario['summary_data'])]
+    if len(indices_with_data) < len(scenarios):
+        logger.warning(f"{len(scenarios) - len(indices_with_data)} scenario(s) had empty simulation results, skipping their LLM summaries.")
+        summaries = [NO_DATA_SUMMARY] * len(scenarios)
+        summaries_with_data = await asummarize_all_scenarios_with_llm(
+            problem_statement,
+            [scenarios[i] for i in indices_with_data],
+            llm_for_simulation_analysis=llm_for_simulation_analysis,
+            verbose=verbose,
+            cache=cache,
+            max_concurrency=max_concurrency
+        )
+        for i, summary in zip(indices_with_data, summaries_with_data):
+            summaries[i] = summary
+        return summaries
+
+    scenarios_str = "\n\n".join(
+        f"--- Scenario {i+1}: {scenario.get('scenario_description', 'No description')}\n{_dump_summary_data(scenario['summary_data'])}"
+        for i, scenario in enumerate(scenarios)
+    )
+    if len(scenarios) > 1 and len(scenarios_str) <= MAX_BATCH_PROMPT_CHARS:
+        llm = select_llm_model(llm_for_simulation_analysis)
+        prompt_template = load_prompt_template('batch_sim_analysis_prompt.yaml')
+        chain = prompt_template | llm | _STRICT_JSON_OUTPUT_PARSER
+        if verbose:
+            print(f"\nSummarizing {len(scenarios)} scenarios with a single LLM call...")
+        def is_one_summary_per_scenario(summaries):
+            return isinstance(summaries, list) and len(summaries) == len(scenarios) and all(isinstance(summary, str) for summary in summaries)
+        try:
+            # Only a well formed answer is cached, otherwise a malformed one would be replayed on every later run
+            summaries = await acached_invoke(
+                chain,
+                {"problem_statement": problem_statement, "scenarios_str": scenarios_str, "num_scenarios": len(scenarios)},
+                llm_for_simulation_analysis,
+                cache=cache,
+                validate=is_one_summary_per_scenario
+            )
+            if is_one_summary_per_scenario(summaries):
+                if verbose:
+                    print("\nLLM Scenario Summaries Generated Successfully.")
+                return summaries
+            logger.error(f"Batched LLM summary did not return one summary per scenario ({len(scenarios)} expected). Falling back to one call per scenario.")
+        except Exception as e:
+            logger.error(f"Error summarizing scenarios in a single LLM call, falling back to one call per scenario: {e}")
+
+    # Per-scenario calls go out as one LCEL batch, bounded by max_concurrency
+    llm = select_llm_model(llm_for_simulation_analysis)
+    prompt_template = load_prompt_template('sim_analysis_prompt.yaml')
+    chain = prompt_template | llm | _STR_OUTPUT_PARSER
+    if verbose:
+        print(f"\nSummarizing {len(scenarios)} scenarios with one LLM call per scenario...")
+    responses = await acached_batch(
+        chain,
+        [{"problem_statement": problem_statement, "summary_data": _dump_summary_data(scenario['summary_data'])} for scenario in scenarios],
+        llm_for_simulation_analysis,
+        cache=cache,
+        max_concurrency=max_concurrency
+    )
+    summaries = []
+    for scenario, response in zip(scenarios, responses):
+        if isinstance(response, Exception):
+            logger.error(f"Error summarizing results with LLM for '{scenario.get('scenario_description', 'No description')}': {response}")
+            response = "Failed to generate summary."
+        summaries.append(response)
+    if verbose:
+        print("\nLLM Scenario Summaries Generated.")
+    return summaries
+
+def summarize_all_scenarios_with_llm(
+    problem_statement: str,
+    scenarios: list[dict],
+    llm_for_simulation_analysis: dict = {'provider': 'google', 'model_name': 'gemini-2.0-flash', 'temperature': 0.5},
+    verbose: bool = False,
+    cache: bool | None = None
+) -> list[str]:
+    """
+    Synchronous wrapper around asummarize_all_scenarios_with_llm.
+    """
+    return _run_sync(asummarize_all_scenarios_with_llm(
+        problem_statement,
+        scenarios,
+        llm_for_simulation_analysis=llm_for_simulation_analysis,
+        verbose=verbose,
+        cache=cache
+    ))
+
 # For final meta-summary of multiple runs
-def generate_final_summary_with_llm(problem_statement: str, 
-                                    all_individual_summaries: list[dict],
-                                    llm_for_summarization: dict = {'provider': 'google', 'model_name': 'gemini-2.0-flash', 'temperature': 0.7},
-                                    verbose: bool = False) -> str:
+async def astream_final_summary_with_llm(problem_statement: str,
+                                         all_individual_summaries: list[dict],
+                                         llm_for_summarization: dict = {'provider': 'google', 'model_name': 'gemini-2.0-flash', 'temperature': 0.7},
+                                         verbose: bool = False,
+                                         cache: bool | None = None):
     """
     Uses an LLM (Gemini) to synthesize a final summary from multiple individual simulation summaries.
+    Async generator yielding the summary text accumulated so far as the LLM streams it.
     """
     llm = select_llm_model(llm_for_summarization)
-    # llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.7) # Higher temperature for more creative synthesis
-    parser = StrOutputParser()
-
-    # Create a string representation of all summaries for the LLM
-    summaries_str = ""
-    for i, summary in enumerate(all_individual_summaries):
-        summaries_str += f"--- Scenario {i+1}: {summary.get('scenario_description', 'No description')}\n"
-        summaries_str += f"{summary['summary_text']}\n\n" # Assuming 'summary_text' holds the individual LLM summary
-
-    # Load the prompt messages from the YAML file
-    prompt_directory = 'prompts'
-    if not os.path.exists(prompt_directory):
-        raise FileNotFoundError(f"Prompt directory not found: {prompt_directory}")    
-    prompt_file = os.path.join(prompt_directory, 'final_sim_analysis_prompt.yaml')
-    prompt_messages = load_prompt_from_file(prompt_file)
-
-    prompt_template = ChatPromptTemplate.from_messages(
-        [
-            ("system", prompt_messages["system_message"]),
-            ("human", prompt_messages["human_message"])
-        ]
+
+    # Create a string representation of all summaries for the LLM, joined once instead of grown with +=
+    summaries_str = "".join(
+        f"--- Scenario {i+1}: {summary.get('scenario_description', 'No description')}\n"
+        f"{summary['summary_text']}\n\n" # Assuming 'summary_text' holds the individual LLM summary
+        for i, summary in enumerate(all_individual_summaries)
     )
 
-    chain = prompt_template | llm | parser
+    prompt_template = load_prompt_template('final_sim_analysis_prompt.yaml')
+    chain = prompt_template | llm | _STR_OUTPUT_PARSER
 
     if verbose:
         print("\nGenerating final comprehensive summary with LLM...")
     try:
-        response = chain.invoke({"problem_statement": problem_statement, "summaries_str": summaries_str})
+        async for partial_response in acached_stream(
+            chain,
+            {"problem_statement": problem_statement, "summaries_str": summaries_str},
+            llm_for_summarization,
+            cache=cache
+        ):
+            yield partial_response
         if verbose:
             print("\nFinal LLM Summary Generated Successfully.")
-        return response
     except Exception as e:
         logger.error(f"Error generating final summary with LLM: {e}")
-        return "Failed to generate final summary."
\ No newline at end of file
+        yield "Failed to generate final summary."
+
+async def agenerate_final_summary_with_llm(problem_statement: str,
+                                           all_individual_summaries: list[dict],
+                                           llm_for_summarization: dict = {'provider': 'google', 'model_name': 'gemini-2.0-flash', 'temperature': 0.7},
+                                           verbose: bool = False,
+                                           cache: bool | None = None) -> str:
+    """
+    Uses an LLM (Gemini) to synthesize a final summary from multiple individual simulation summaries.
+    Returns the complete summary once the LLM has finished generating it.
+    """
+    response = ""
+    async for response in astream_final_summary_with_llm(
+        problem_statement,
+        all_individual_summaries,
+        llm_for_summarization=llm_for_summarization,
+        verbose=verbose,
+        cache=cache
+    ):
+        pass
+    return response
+
+def generate_final_summary_with_llm(problem_statement: str,
+                                    all_individual_summaries: list[dict],
+                                    llm_for_summarization: dict = {'provider': 'google', 'model_name': 'gemini-2.0-flash', 'temperature': 0.7},
+                                    verbose: bool = False,
+                                    cache: bool | None = None) -> str:
+    """
+    Synchronous wrapper around agenerate_final_summary_with_llm, kept for backward compatibility.
+    """
+    return _run_sync(agenerate_final_summary_with_llm(
+        problem_statement,
+        all_individual_summaries,
+        llm_for_summarization=llm_for_summarization,
+        verbose=verbose,
+        cache=cache
+    ))
\ No newline at end of file
@@ -2,6 +2,21 @@ import os
 from datetime import datetime
 import json
 import re
+import keyword
+from functools import lru_cache
+
+# Regex explanation:
+# [a-zA-Z0-9_]+ : Matches one or more (the `+` sign) occurrences of:
+#                 - any lowercase letter (a-z)
+#                 - any uppercase letter (A-Z)
+#                 - any digit (0-9)
+#                 - an underscore (_)
+#               Since it matches one or more greedily, it inherently starts and ends
+#               with one of these characters, so no word boundaries are needed.
+# Compiled once at import, extract_variables runs for every formula of every diagram
+_VARIABLE_PATTERN = re.compile(r'[a-zA-Z0-9_]+')
+# Python keywords and the builtins formulas commonly call can never be model components
+_RESERVED_WORDS = frozenset(keyword.kwlist) | {'max', 'min', 'abs'}
 
 def extract_variables(text):
     """
@@ -12,56 +27,69 @@ def extract_variables(text):
         text (str): The input string from which to extract the patterns.
 
     Returns:
-        list: A list of unique strings found that match the defined patterns.
+        list: A sorted list of unique strings found that match the defined patterns,
+              excluding numeric literals and Python keywords or common builtins (max, min, abs).
     """
-    # Regex explanation:
-    # \b          : Word boundary (ensures we match whole words)
-    # [a-zA-Z0-9_]+ : Matches one or more (the `+` sign) occurrences of:
-    #                 - any lowercase letter (a-z)
-    #                 - any uppercase letter (A-Z)
-    #                 - any digit (0-9)
-    #                 - an underscore (_)
-    #               Since it matches one or more, it inherently starts and ends
-    #               with one of these characters if it's a valid match.
-    # \b          : Word boundary (ensures we match whole words)
-    pattern = re.compile(r'\b[a-zA-Z0-9_]+\b')
-
-    # Find all matches
-    matches = pattern.findall(text)
-
-    # Return unique matches to avoid duplicates if a string appears multiple times
-    return sorted(list(set(matches)))
+    # Return unique matches to avoid duplicates if a string appears multiple times.
+    # Numeric literals and reserved words are dropped here, so callers only look up candidate names
+    variables = {
+        match for match in _VARIABLE_PATTERN.findall(text)
+        if not match[0].isdigit() and match not in _RESERVED_WORDS
+    }
+    return sorted(variables)
 
 # function generates a mermaid diagram for a given model
 # uses different visual styles for stocks, auxiliaries, flows, and parameters
 def generate_model_diagram(model_config: dict) -> str:
     """
     Generates a Mermaid diagram string for the given model configuration.
+    Diagrams are memoized on the model structure, so scenarios that only change parameter values reuse the same diagram.
     """
-
+    # Only the fields the diagram shows are part of the key (parameter values are not), in their original order
+    diagram_structure = {
+        'stocks': [{'name': stock['name'], 'unit': stock['unit']} for stock in model_config['stocks']],
+        'auxiliaries': [{'name': aux['name'], 'unit': aux['unit'], 'formula': aux.get('formula', '')} for aux in model_config['auxiliaries']],
+        'parameters': {param_name: {'unit': param['unit']} for param_name, param in model_config['parameters'].items()},
+        'flows': [{'name': flow['name'], 'unit': flow['unit'], 'formula': flow.get('formula', '')} for flow in model_config['flows']],
+        'flow_connections': model_config['flow_connections']
+    }
+    return _generate_model_diagram_cached(json.dumps(diagram_structure, default=str))
+
+@lru_cache(maxsize=64)
+def _generate_model_diagram_cached(diagram_structure_json: str) -> str:
+    return _build_model_diagram(json.loads(diagram_structure_json))
+
+def _build_model_diagram(model_config: dict) -> str:
+
+    # Diagram lines are collected in a list and joined once at the end instead of growing a string with +=
     # add mermaid diagram header
-    diagram = "```mermaid\n"
-    diagram += "graph LR\n"
+    parts = ["```mermaid", "graph LR"]
+
+    # Name lookups used when connecting formula variables, built once so each check is a set membership test
+    stock_names = {stock['name'] for stock in model_config['stocks']}
+    aux_names = {aux['name'] for aux in model_config['auxiliaries']}
+    flow_names = {flow['name'] for flow in model_config['flows']}
+    param_names = set(model_config['parameters'])
 
     # Add stocks
     for stock in model_config['stocks']:
-        diagram += f"  {stock['name']}[\"STOCK: {stock['name']} ({stock['unit']})\"]\n"
-        diagram += f"  class {stock['name']} stockNode\n"
+        parts.append(f"  {stock['name']}[\"STOCK: {stock['name']} ({stock['unit']})\"]")
+        parts.append(f"  class {stock['name']} stockNode")
 
     # Add auxiliaries, use assymetric node shape for auxiliaries (example: a1>"This is the text in the box"] )
     for aux in model_config['auxiliaries']:
-        diagram += f"  {aux['name']}>\"AUX: {aux['name']} ({aux['unit']}\"] \n"
-        diagram += f"  class {aux['name']} auxNode\n"
+        parts.append(f"  {aux['name']}>\"AUX: {aux['name']} ({aux['unit']}\"] ")
+        parts.append(f"  class {aux['name']} auxNode")
 
     # Add parameters, use database node shape for parameters (example: d1[(Database)])
     for param_name, param in model_config['parameters'].items():
-        diagram += f"  {param_name}[(\"PARAM: {param_name} ({param['unit']})\")] \n"
-        diagram += f"  class {param_name} paramNode\n"
+        parts.append(f"  {param_name}[(\"PARAM: {param_name} ({param['unit']})\")] ")
+        parts.append(f"  class {param_name} paramNode")
 
     # Add flows, use subroutine node shape for flows (example: f1[[Flow]])
     for flow in model_config['flows']:
-        diagram += f"  {flow['name']}[[\"FLOW: {flow['name']} ({flow['unit']})\"]]\n"
-        diagram += f"  class {flow['name']} flowNode\n"
+        parts.append(f"  {flow['name']}[[\"FLOW: {flow['name']} ({flow['unit']})\"]]")
+        parts.append(f"  class {flow['name']} flowNode")
 
     # Add flow connections with animated arrows
     count = 0
@@ -69,79 +97,47 @@ def generate_model_diagram(model_config: dict) -> str:
         flow_name, stock_name, direction = connection
         count += 1
         if direction == 'inflow':
-            diagram += f"  {flow_name} e{count}@==>|\"inflow\"| {stock_name}:::animated\n"
-            diagram += f"  e{count}@{{ animate: true }}\n"
+            parts.append(f"  {flow_name} e{count}@==>|\"inflow\"| {stock_name}:::animated")
+            parts.append(f"  e{count}@{{ animate: true }}")
         else:
-            diagram += f"  {stock_name} e{count}@==>|\"outflow\"| {flow_name}:::animated\n"
-            diagram += f"  e{count}@{{ animate: true }}\n"
+            parts.append(f"  {stock_name} e{count}@==>|\"outflow\"| {flow_name}:::animated")
+            parts.append(f"  e{count}@{{ animate: true }}")
 
     # Connect parameters to auxiliaries to flows
     # if a parameter is used in an auxiliary or flow formula, then add a connection to that auxiliary or flow
     # if auxiliary is used in a flow formula, then add a connection to that flow
-    # these connects should be in the form of dashed lines
-    for aux in model_config['auxiliaries']:
-        for param_name in extract_variables(aux.get('formula', '')):
-            # # remove ['value'] string from parameter name
-            # if '[' in param_name:
-            #     param_name = param_name.split('[')[0]
-            # param_name = ''.join(c for c in param_name if c.isalnum() or c == '_')
-            # print(f"Checking parameter: {param_name} in auxiliary: {aux['name']}")
-            if param_name in model_config['parameters'].keys():
-                # print(f"Adding connection from parameter: {param_name} to auxiliary: {aux['name']}")
-                diagram += f"  {param_name} -.-> {aux['name']}\n"
-            # else:
-                # print(f"Parameter: {param_name} not found in {model_config['parameters'].keys()}.")
-    for aux in model_config['auxiliaries']:
-        for aux_name in extract_variables(aux.get('formula', '')):
-            # if '[' in aux_name:
-            #     aux_name = aux_name.split('[')[0]
-            # aux_name = ''.join(c for c in aux_name if c.isalnum() or c == '_')
-            if any(aux_item['name'] == aux_name for aux_item in model_config['auxiliaries']):
-                diagram += f"  {aux_name} -.-> {aux['name']}\n"
-    for flow in model_config['flows']:
-        for param_name in extract_variables(flow.get('formula', '')):
-            if param_name in model_config['parameters'].keys():
-                diagram += f"  {param_name} -.-> {flow['name']}\n"
-    for flow in model_config['flows']:
-        for aux_name in extract_variables(flow.get('formula', '')):
-            # if '[' in aux_name:
-            #     aux_name = aux_name.split('[')[0]
-            # aux_name = ''.join(c for c in aux_name if c.isalnum() or c == '_')
-            if any(aux['name'] == aux_name for aux in model_config['auxiliaries']):
-                diagram += f"  {aux_name} -.-> {flow['name']}\n"
-    for flow in model_config['flows']:
-        for flow_name in extract_variables(flow.get('formula', '')):
-            # if '[' in flow_name:
-            #     flow_name = flow_name.split('[')[0]
-            # flow_name = ''.join(c for c in flow_name if c.isalnum() or c == '_')
-            if any(flow_item['name'] == flow_name for flow_item in model_config['flows']):
-                diagram += f"  {flow_name} -.-> {flow['name']}\n"
+    # these connects should be in the form of dashed lines, stocks used in a formula get a solid line
+    # Each formula is scanned once and every variable is dispatched to the edges for its kind(s)
     for aux in model_config['auxiliaries']:
-        for stock_name in extract_variables(aux.get('formula', '')):
-            # if '[' in stock_name:
-            #     stock_name = stock_name.split('[')[0]
-            # stock_name = ''.join(c for c in stock_name if c.isalnum() or c == '_')
-            if any(stock_item['name'] == stock_name for stock_item in model_config['stocks']):
-                diagram += f"  {stock_name} --- {aux['name']}\n"
+        for variable in extract_variables(aux.get('formula', '')):
+            if variable in param_names:
+                parts.append(f"  {variable} -.-> {aux['name']}")
+            if variable in aux_names:
+                parts.append(f"  {variable} -.-> {aux['name']}")
+            if variable in stock_names:
+                parts.append(f"  {variable} --- {aux['name']}")
     for flow in model_config['flows']:
-        for stock_name in extract_variables(flow.get('formula', '')):
-            # if '[' in stock_name:
-            #     stock_name = stock_name.split('[')[0]
-            # stock_name = ''.join(c for c in stock_name if c.isalnum() or c == '_')
-            if any(stock_item['name'] == stock_name for stock_item in model_config['stocks']):
-                diagram += f"  {stock_name} --- {flow['name']}\n"
+        for variable in extract_variables(flow.get('formula', '')):
+            if variable in param_names:
+                parts.append(f"  {variable} -.-> {flow['name']}")
+            if variable in aux_names:
+                parts.append(f"  {variable} -.-> {flow['name']}")
+            if variable in flow_names:
+                parts.append(f"  {variable} -.-> {flow['name']}")
+            if variable in stock_names:
+                parts.append(f"  {variable} --- {flow['name']}")
     
     # Add class definitions for node colors/styles
-    diagram += "  classDef stockNode fill:#FFD700,stroke:#B8860B,stroke-width:4px,color:#000,font-weight:bold\n"
-    diagram += "  classDef flowNode fill:#87CEEB,stroke:#4682B4,stroke-width:2px,color:#000\n"
-    diagram += "  classDef auxNode fill:#B0E57C,stroke:#228B22,stroke-width:2px,color:#000\n"
-    diagram += "  classDef paramNode fill:#E0E0E0,stroke:#888,stroke-width:1px,color:#666\n"
-    diagram += "  classDef animated stroke-dasharray: 5 5, animate: true, animation: fast\n"
+    parts.append("  classDef stockNode fill:#FFD700,stroke:#B8860B,stroke-width:4px,color:#000,font-weight:bold")
+    parts.append("  classDef flowNode fill:#87CEEB,stroke:#4682B4,stroke-width:2px,color:#000")
+    parts.append("  classDef auxNode fill:#B0E57C,stroke:#228B22,stroke-width:2px,color:#000")
+    parts.append("  classDef paramNode fill:#E0E0E0,stroke:#888,stroke-width:1px,color:#666")
+    parts.append("  classDef animated stroke-dasharray: 5 5, animate: true, animation: fast")
 
     # close the mermaid diagram with ```
-    diagram += "```\n"
+    parts.append("```")
 
-    return diagram
+    return "\n".join(parts) + "\n"
 
 if __name__ == "__main__":
     # read a json file with the model configuration
@@ -0,0 +1,165 @@
+# llm_cache.py
+import os
+import json
+import time
+import asyncio
+import hashlib
+import sqlite3
+import logging
+from contextlib import closing
+from functools import lru_cache
+from src.llm_retry import invoke_with_retry, ainvoke_with_retry, astream_with_retry, is_transient_llm_error
+
+logger = logging.getLogger(__name__)
+
+# Cache settings, responses are stored in a small SQLite database in the project root
+CACHE_DIRECTORY = '.llm_cache'
+CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+# Only responses generated at or below this temperature are cached by default (near deterministic outputs)
+DETERMINISTIC_TEMPERATURE = 0.2
+
+@lru_cache(maxsize=None)
+def _initialized_cache_path(cache_directory):
+    """Creates the cache directory and table once per process (and directory), returns the database path."""
+    os.makedirs(cache_directory, exist_ok=True)
+    path = os.path.join(cache_directory, 'responses.sqlite')
+    with closing(sqlite3.connect(path, timeout=30)) as connection, connection:
+        connection.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)")
+    return path
+
+def _connect():
+    # Callers close the connection with contextlib.closing, using it as a context manager only commits
+    return sqlite3.connect(_initialized_cache_path(os.path.abspath(CACHE_DIRECTORY)), timeout=30)
+
+def _should_cache(llm_config, cache):
+    """Explicit cache flag wins, otherwise only low temperature (deterministic) calls are cached."""
+    if cache is not None:
+        return cache
+    return llm_config.get("temperature", 0.2) <= DETERMINISTIC_TEMPERATURE
+
+def make_cache_key(chain, inputs, llm_config):
+    """
+    Builds a SHA-256 key from the llm config and the fully rendered prompt.
+    Rendering the prompt means edits to the prompt YAML files invalidate old entries.
+    """
+    prompt = getattr(chain, 'first', None)
+    try:
+        rendered = prompt.invoke(inputs).to_string()
+    except Exception:
+        rendered = json.dumps(inputs, sort_keys=True, default=str)
+    payload = json.dumps({"cfg": llm_config, "prompt": rendered}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def get_cached_response(key):
+    """Returns (hit, value) for the given key, ignoring expired entries."""
+    try:
+        with closing(_connect()) as connection:
+            row = connection.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+    except sqlite3.Error as e:
+        logger.error(f"Error reading LLM cache: {e}")
+        return False, None
+    if row is None or time.time() - row[1] > CACHE_TTL_SECONDS:
+        return False, None
+    return True, json.loads(row[0])
+
+def set_cached_response(key, value):
+    try:
+        with closing(_connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time())
+            )
+    except (sqlite3.Error, TypeError, ValueError) as e:
+        logger.error(f"Error writing LLM cache: {e}")
+
+def cached_invoke(chain, inputs, llm_config, cache=None, validate=None):
+    """
+    Invokes the chain, serving identical (llm config, prompt) requests from the on-disk cache.
+    Transient provider errors are retried with backoff (see llm_retry) before being raised.
+    Pass cache=True to cache higher temperature calls, or cache=False to bypass the cache.
+    If validate is given, only responses it accepts are cached (and served from the cache), others are
+    returned to the caller as is, so a malformed answer is not replayed on later calls.
+    """
+    if not _should_cache(llm_config, cache):
+        return invoke_with_retry(chain, inputs)
+    key = make_cache_key(chain, inputs, llm_config)
+    hit, value = get_cached_response(key)
+    if hit and (validate is None or validate(value)):
+        return value
+    response = invoke_with_retry(chain, inputs)
+    if validate is None or validate(response):
+        set_cached_response(key, response)
+    return response
+
+# The async variants read and write the cache in a worker thread, so its disk I/O does not block the event loop
+
+async def acached_invoke(chain, inputs, llm_config, cache=None, validate=None):
+    """Async variant of cached_invoke, awaiting chain.ainvoke on a cache miss."""
+    if not _should_cache(llm_config, cache):
+        return await ainvoke_with_retry(chain, inputs)
+    key = make_cache_key(chain, inputs, llm_config)
+    hit, value = await asyncio.to_thread(get_cached_response, key)
+    if hit and (validate is None or validate(value)):
+        return value
+    response = await ainvoke_with_retry(chain, inputs)
+    if validate is None or validate(response):
+        await asyncio.to_thread(set_cached_response, key, response)
+    return response
+
+async def acached_stream(chain, inputs, llm_config, cache=None):
+    """
+    Streams the chain output as accumulated text, so callers can render partial responses.
+    A cache hit yields the full cached response once; a miss is cached after the stream completes.
+    """
+    use_cache = _should_cache(llm_config, cache)
+    if use_cache:
+        key = make_cache_key(chain, inputs, llm_config)
+        hit, value = await asyncio.to_thread(get_cached_response, key)
+        if hit:
+            yield value
+            return
+    response = ""
+    async for chunk in astream_with_retry(chain, inputs):
+        response += chunk
+        yield response
+    if use_cache:
+        await asyncio.to_thread(set_cached_response, key, response)
+
+async def acached_batch(chain, inputs_list, llm_config, cache=None, max_concurrency=None):
+    """
+    Batched variant of acached_invoke: cache hits are served from disk and the misses go out in a single
+    chain.abatch call (at most max_concurrency requests in flight). Returns one result per input, in order,
+    with the exception in place of the result for inputs that failed.
+    """
+    use_cache = _should_cache(llm_config, cache)
+    keys = [make_cache_key(chain, inputs, llm_config) if use_cache else None for inputs in inputs_list]
+    results = [None] * len(inputs_list)
+    missing_indices = []
+    cached = await asyncio.to_thread(lambda: [get_cached_response(key) for key in keys]) if use_cache else [(False, None)] * len(keys)
+    for i, (hit, value) in enumerate(cached):
+        if hit:
+            results[i] = value
+        else:
+            missing_indices.append(i)
+    if not missing_indices:
+        return results
+
+    responses = await chain.abatch(
+        [inputs_list[i] for i in missing_indices],
+        config={"max_concurrency": max_concurrency},
+        return_exceptions=True
+    )
+    to_cache = []
+    for i, response in zip(missing_indices, responses):
+        if isinstance(response, Exception) and is_transient_llm_error(response):
+            # Rate limited requests of the batch are retried one by one with backoff
+            try:
+                response = await ainvoke_with_retry(chain, inputs_list[i])
+            except Exception as e:
+                response = e
+        if use_cache and not isinstance(response, Exception):
+            to_cache.append((keys[i], response))
+        results[i] = response
+    if to_cache:
+        await asyncio.to_thread(lambda: [set_cached_response(key, response) for key, response in to_cache])
+    return results
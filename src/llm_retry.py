@@ -0,0 +1,62 @@
+# llm_retry.py
+import logging
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential_jitter, before_sleep_log
+
+logger = logging.getLogger(__name__)
+
+# Retry settings for transient provider errors (rate limits, overloaded or unreachable servers)
+MAX_ATTEMPTS = 5
+INITIAL_WAIT_SECONDS = 1
+MAX_WAIT_SECONDS = 30
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504, 529}
+# Exception class names used by the google, openai and anthropic clients for transient failures
+TRANSIENT_ERROR_NAMES = {
+    'RateLimitError', 'APIConnectionError', 'APITimeoutError', 'InternalServerError', 'OverloadedError',
+    'ResourceExhausted', 'ServiceUnavailable', 'DeadlineExceeded', 'TooManyRequests'
+}
+
+def is_transient_llm_error(exception: BaseException) -> bool:
+    """True for errors worth retrying, matched by HTTP status or exception class name to avoid importing every provider SDK."""
+    status = getattr(exception, 'status_code', None) or getattr(exception, 'code', None)
+    if status in TRANSIENT_STATUS_CODES:
+        return True
+    return any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(exception).__mro__)
+
+# Retries with exponential backoff and jitter, then re-raises the last error so callers can degrade gracefully
+_retry_transient_errors = retry(
+    retry=retry_if_exception(is_transient_llm_error),
+    stop=stop_after_attempt(MAX_ATTEMPTS),
+    wait=wait_exponential_jitter(initial=INITIAL_WAIT_SECONDS, max=MAX_WAIT_SECONDS),
+    before_sleep=before_sleep_log(logger, logging.WARNING),
+    reraise=True
+)
+
+@_retry_transient_errors
+def invoke_with_retry(chain, inputs):
+    return chain.invoke(inputs)
+
+@_retry_transient_errors
+async def ainvoke_with_retry(chain, inputs):
+    return await chain.ainvoke(inputs)
+
+@_retry_transient_errors
+async def _aopen_stream(chain, inputs):
+    # Rate limit and connection errors surface before the first chunk arrives, so only that part is retried
+    stream = chain.astream(inputs).__aiter__()
+    try:
+        first_chunk = await stream.__anext__()
+    except StopAsyncIteration:
+        return None, None
+    return stream, first_chunk
+
+async def astream_with_retry(chain, inputs):
+    """
+    Streams the chain output chunk by chunk, retrying transient errors raised before the first chunk.
+    Errors after streaming has started are raised as is, since partial output was already produced.
+    """
+    stream, first_chunk = await _aopen_stream(chain, inputs)
+    if stream is None:
+        return
+    yield first_chunk
+    async for chunk in stream:
+        yield chunk
@@ -1,14 +1,15 @@
 # model_generation.py
 import json
 import yaml
-import os
 import logging
 from dotenv import load_dotenv
 # from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.runnables import RunnableLambda
 from pydantic import BaseModel, Field
-from src.utils import load_prompt_from_file, select_llm_model
+from src.utils import load_prompt_template, select_llm_model
+from src.llm_cache import cached_invoke
+from src.simulation_core import simulate_model
 from typing import Optional
 
 # Load environment variables (like GOOGLE_API_KEY)
@@ -63,36 +64,95 @@ class ModelConfig(BaseModel):
     simulation_settings: SimulationSettings = Field(description="Settings for the simulation run. 'end_time' and 'dt' must have a 'value' and 'unit'.")
     problem_description: str = Field(description="The original problem statement provided by the user.")
 
+# Tool calling schemas cannot express open-ended dicts (Gemini turns dict[str, ParameterDefinition] into a STRING),
+# so the structured output path asks for the parameters as a list of named parameters instead
+
+class NamedParameterDefinition(BaseModel):
+    name: str = Field(description="Unique name of the parameter, as referenced in formulas. Use UPPER_CASE. Examples: 'PRODUCTION_COST', 'DEMAND_ELASTICITY'.")
+    value: float = Field(description="Numerical value of the parameter.")
+    unit: str = Field(description="Unit of measurement for the parameter. E.g., 'USD/unit', 'ratio', 'days'.")
+    description: str = Field(description="One-line natural language description of what this parameter represents.")
+
+class StructuredModelConfig(ModelConfig):
+    parameters: list[NamedParameterDefinition] = Field(description="List of parameters (constants) used in formulas. Each parameter must have a 'name', 'value' and 'unit'.")
+
+    def to_model_config(self) -> dict:
+        """Returns the plain model config, with the parameters as a dictionary keyed by name like ModelConfig."""
+        model_config = self.model_dump()
+        model_config['parameters'] = {parameter.pop('name'): parameter for parameter in model_config['parameters']}
+        return model_config
+
+def _structured_output_to_model_config(model_config: Optional[StructuredModelConfig]) -> dict:
+    # A missing result raises, so it is not stored in the response cache and the next run tries structured output again
+    if model_config is None:
+        raise ValueError("Structured output returned no model config.")
+    return model_config.to_model_config()
+
+
+# Keys the simulation and the orchestrator read from a generated model config
+REQUIRED_MODEL_CONFIG_KEYS = ('stocks', 'parameters', 'auxiliaries', 'flows', 'flow_connections', 'simulation_settings')
+
+def _is_simulatable_model_config(model_config) -> bool:
+    """
+    True if a generated model config has the required keys and simulates without errors.
+    Only such configs are stored in the response cache, a broken one would be replayed to every later run.
+    """
+    if not isinstance(model_config, dict) or not all(key in model_config for key in REQUIRED_MODEL_CONFIG_KEYS):
+        return False
+    try:
+        simulate_model(model_config)
+    except Exception as e:
+        logger.error(f"Generated model config does not simulate, it is not cached: {e}")
+        return False
+    return True
 
 def generate_model_config_with_llm(problem_statement: str,
                                    llm_for_generating_system_model: dict,
-                                   verbose: bool = False) -> Optional[dict]:
+                                   verbose: bool = False,
+                                   cache: bool | None = None) -> Optional[dict]:
     """
     Generates a model configuration using an LLM based on the provided problem statement.
+    Responses are cached on disk for low temperature configs; pass cache=True/False to override.
+    Only configs that simulate are cached (see _is_simulatable_model_config).
     """
     llm = select_llm_model(llm_for_generating_system_model)
     parser = JsonOutputParser(pydantic_object=ModelConfig)
 
-    # Load the prompt messages from the YAML file
-    prompt_directory = 'prompts'
-    if not os.path.exists(prompt_directory):
-        raise FileNotFoundError(f"Prompt directory not found: {prompt_directory}")
-    prompt_file = os.path.join(prompt_directory, 'model_generation_prompt.yaml')
-    prompt_messages = load_prompt_from_file(prompt_file)
-
-    prompt_template = ChatPromptTemplate.from_messages(
-        [
-            ("system", prompt_messages["system_message"]),
-            ("human", prompt_messages["human_message"])
-        ]
-    )
+    prompt_template = load_prompt_template('model_generation_prompt.yaml')
 
     chain = prompt_template | llm | parser
 
     if verbose:
         print("Generating model configuration with LLM... This might take a moment.")
+    # Preferred path: the provider's native tool calling enforces the ModelConfig schema, so no JSON string has to be parsed
+    try:
+        # The pydantic result is dumped inside the chain, so the cache stores plain JSON
+        structured_chain = (
+            prompt_template
+            | llm.with_structured_output(StructuredModelConfig, method="function_calling")
+            | RunnableLambda(_structured_output_to_model_config)
+        )
+        structured_response = cached_invoke(
+            structured_chain,
+            {"problem_statement": problem_statement, "format_instructions": ""},
+            llm_for_generating_system_model,
+            cache=cache,
+            validate=_is_simulatable_model_config
+        )
+        if verbose:
+            print("\nLLM Model Configuration Generated Successfully.")
+        return structured_response
+    except Exception as e:
+        # Not every model supports tool calling
+        logger.error(f"Structured output failed, falling back to JSON output parsing: {e}")
     try:
-        response = chain.invoke({"problem_statement": problem_statement, "format_instructions": parser.get_format_instructions()})
+        response = cached_invoke(
+            chain,
+            {"problem_statement": problem_statement, "format_instructions": parser.get_format_instructions()},
+            llm_for_generating_system_model,
+            cache=cache,
+            validate=_is_simulatable_model_config
+        )
         if verbose:
             print("\nLLM Model Configuration Generated Successfully.")
         return response
@@ -100,4 +160,4 @@ def generate_model_config_with_llm(problem_statement: str,
         logger.error(f"Error generating model config with LLM: {e}")
         if verbose:
             print(f"Error generating model config with LLM. Check logs/error.log for details.")
-        return None
\ No newline at end of file
+        return None
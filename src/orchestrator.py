@@ -1,69 +1,130 @@
 # orchestrator.py
-import json
-import copy
+import orjson
 import datetime
-import pandas as pd
 import os # Make sure os module is imported
 from dotenv import load_dotenv
 import logging
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import atexit
+import queue
+import multiprocessing
+from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import ProcessPoolExecutor
 
 # Import components from their new modules
-from src.simulation_core import System
+from src.simulation_core import simulate_model
 from src.model_generation import generate_model_config_with_llm
-from src.analysis_and_summary import summarize_simulation_results_with_llm, generate_final_summary_with_llm
+from src.analysis_and_summary import normalize_model_parameters, build_summary_data, asummarize_all_scenarios_with_llm, astream_final_summary_with_llm
 from src.parameter_variation import generate_parameter_variations_with_llm
 from src.generate_diagrams import generate_model_diagram
 
-# Set up logging to file in logs directory
-os.makedirs('logs', exist_ok=True)
-# Create a unique error log file for each run
-error_log_filename = os.path.join('logs', f"error_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
-logging.basicConfig(
-    filename=error_log_filename,
-    level=logging.ERROR,
-    format='%(asctime)s %(levelname)s %(message)s'
-)
+error_log_filename = None
+_error_log_listener = None
+
+def configure_error_logging():
+    """
+    Sets up logging of errors to a unique file in the logs directory, once per process.
+    Called by the entry points rather than at import, so processes that only import this module (the simulation
+    workers re-import the main module) neither create a log file nor start the listener thread.
+    """
+    global error_log_filename, _error_log_listener
+    if _error_log_listener is not None:
+        return
+    os.makedirs('logs', exist_ok=True)
+    # Create a unique error log file for each run
+    error_log_filename = os.path.join('logs', f"error_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
+    # Records are only queued by the logging calls, a background listener thread writes them to the file,
+    # so errors logged inside scenario coroutines never block the event loop on disk I/O
+    error_log_handler = logging.FileHandler(error_log_filename)
+    error_log_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    error_log_queue = queue.SimpleQueue()
+    _error_log_listener = QueueListener(error_log_queue, error_log_handler, respect_handler_level=True)
+    _error_log_listener.start()
+    atexit.register(_error_log_listener.stop) # Flushes the queued records on shutdown
+    error_log_queue_handler = QueueHandler(error_log_queue)
+    error_log_queue_handler.setFormatter(logging.Formatter('%(message)s')) # The file handler adds the time and level
+    logging.basicConfig(
+        level=logging.ERROR,
+        handlers=[error_log_queue_handler]
+    )
 
 load_dotenv() # Ensure env variables are loaded for all modules
 
-def _run_simulation_and_summarize(scenario_description, current_model_config, problem_statement, llm_for_simulation_analysis, verbose):
+# Default upper bound on scenarios simulated, and scenario summaries awaiting the LLM, at the same time.
+# Keeps the fan-out below provider rate limits, where 429 retries would otherwise serialize the batch
+MAX_CONCURRENT_SCENARIOS = 10
+
+class LazyJSON:
+    """Wraps an object for %s style logging, it is only serialized to JSON if a handler actually emits the record."""
+    __slots__ = ('obj',)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __str__(self):
+        return orjson.dumps(self.obj, option=orjson.OPT_INDENT_2).decode()
+
+# Simulations are pure Python and hold the GIL, so they run in worker processes to use every core.
+# Forking a process that already runs threads (log listener, LLM client pools) can deadlock the child,
+# so the workers are started from a fork server where the platform has one. The fork server preloads only the
+# simulation core, not __main__ (app.py imports gradio and builds the UI)
+_SIMULATION_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+_simulation_mp_context = multiprocessing.get_context(_SIMULATION_START_METHOD)
+if _SIMULATION_START_METHOD == 'forkserver':
+    _simulation_mp_context.set_forkserver_preload(['src.simulation_core'])
+_simulation_executor = None
+
+def _get_simulation_executor():
+    """
+    Returns the process pool simulations run in. It is created on first use and shared by every run of the process,
+    so workers start (and set up the main module) once, and no run blocks the event loop shutting a pool down.
+    A pool broken by a crashed worker is replaced.
+    """
+    global _simulation_executor
+    if _simulation_executor is None:
+        atexit.register(_shutdown_simulation_executor)
+    if _simulation_executor is None or _simulation_executor._broken:
+        _simulation_executor = ProcessPoolExecutor(max_workers=os.cpu_count() or 1, mp_context=_simulation_mp_context)
+    return _simulation_executor
+
+def _shutdown_simulation_executor():
+    # The pool is released too, so its queues' semaphores are cleaned up before the interpreter exits
+    global _simulation_executor
+    if _simulation_executor is not None:
+        _simulation_executor.shutdown()
+        _simulation_executor = None
+
+async def _run_scenario_simulation(scenario_description, current_model_config, stock_names, problem_statement, verbose, simulation_executor):
     try:
-        sim_system = System(current_model_config)
-        end_time_value = current_model_config.get('simulation_settings', {}).get('end_time', {}).get('value', 100)
+        # The simulation is CPU bound, run it in a worker process so that scenarios simulate in parallel
+        simulation_results, model_parameters, component_units = await asyncio.get_running_loop().run_in_executor(
+            simulation_executor, simulate_model, current_model_config
+        )
         time_unit = current_model_config.get('simulation_settings', {}).get('end_time', {}).get('unit', 'days')
-        simulation_results = sim_system.run_simulation(end_time=end_time_value)
         if verbose:
             print(f"Simulation for '{scenario_description}' completed successfully.")
             print("### Raw Simulation Data (First 5 and Last 5 Rows):")
             if not simulation_results.empty:
-                print(simulation_results.head().to_markdown(index=False))
+                # to_string is vectorized, to_markdown formats every cell through tabulate
+                print(simulation_results.head().to_string(index=False))
                 print("...")
-                print(simulation_results.tail().to_markdown(index=False))
+                print(simulation_results.tail().to_string(index=False))
             else:
                 print("No simulation data generated.\n")
-        stock_names = [s['name'] for s in current_model_config.get('stocks', [])]
-        individual_summary_text = summarize_simulation_results_with_llm(
+        summary_data = build_summary_data(
             problem_statement,
             simulation_results,
-            model_parameters=sim_system.parameters,
+            model_parameters=normalize_model_parameters(model_parameters),
             stock_names=stock_names,
-            component_units=sim_system.component_units,
+            component_units=component_units,
             time_unit=time_unit,
-            llm_for_simulation_analysis=llm_for_simulation_analysis,
             verbose=verbose
         )
-        if verbose:
-            print(f"\n--- AI Summary for Scenario: {scenario_description} ---")
-            print(individual_summary_text)
-            print("---------------------------------------------------\n")
-            print("### AI Generated Summary:")
-            print(individual_summary_text + "\n")
+        # The DataFrame is dropped here, only its summary data is kept for the rest of the run
         return {
             "scenario_description": scenario_description,
-            "summary_text": individual_summary_text,
-            "simulation_results": simulation_results
+            "summary_data": summary_data,
+            "summary_text": None
         }
     except Exception as e:
         error_message = f"Error during simulation for '{scenario_description}': {e}"
@@ -72,16 +133,23 @@ def _run_simulation_and_summarize(scenario_description, current_model_config, pr
             print(f"### Simulation Error:")
             print(f"{error_message}\n")
         logging.error(error_message, exc_info=e)
-        if isinstance(e, ValueError) and ("Error calculating" in str(e)):
+        if isinstance(e, ValueError) and ("Error calculating" in str(e) or "Error compiling" in str(e)):
             if verbose:
                 print("Please review the generated model configuration, especially the formulas, for correctness.\n")
         return {
             "scenario_description": scenario_description,
-            "summary_text": f"Simulation failed with error: {e}",
-            "simulation_results": None
+            "summary_data": None,
+            "summary_text": f"Simulation failed with error: {e}"
         }
 
-async def run_analysis(
+async def _stream_scenarios(scenario_tasks):
+    """Yields (index, result) for each scenario task as soon as it completes, so progress is reported one at a time."""
+    async def indexed(index, task):
+        return index, await task
+    for next_completed in asyncio.as_completed([indexed(index, task) for index, task in enumerate(scenario_tasks)]):
+        yield await next_completed
+
+async def astream_analysis(
         problem_statement: str,
         num_variations: int = 1,
         output_directory: str = "output",
@@ -89,9 +157,15 @@ async def run_analysis(
         llm_for_generating_scenarios: dict = {},
         llm_for_simulation_analysis: dict = {},
         llm_for_summarization: dict = {},
-        verbose: bool = False
-    ) -> tuple[str, str]:
+        verbose: bool = False,
+        max_concurrency: int = MAX_CONCURRENT_SCENARIOS
+    ):
     """
+    Streaming version of run_analysis. Async generator yielding (final_summary, model_diagram) tuples:
+    first with an empty summary as soon as the model diagram is available, then with the final
+    summary accumulated so far while the LLM streams it.
+    At most max_concurrency scenarios are simulated, and summarized one call per scenario, at the same time.
+
     Main function to orchestrate the entire process:
     1. Get problem statement from user.
     2. Generate base model config using LLM.
@@ -100,6 +174,7 @@ async def run_analysis(
     5. Summarize results for each variation using LLM.
     6. Generate a final comprehensive summary if multiple variations were run.
     """
+    configure_error_logging()
     if verbose:
         print("--- System Dynamics Model Generation and Analysis ---")
     # Step 1: Get problem statement from user if not provided
@@ -115,15 +190,21 @@ async def run_analysis(
             if verbose:
                 print("Number of variations must be at least 1. Setting to 1.")
             num_variations = 1
+        if max_concurrency < 1:
+            if verbose:
+                print("Maximum concurrency must be at least 1. Setting to 1.")
+            max_concurrency = 1
 
     os.makedirs(output_directory, exist_ok=True) # exist_ok=True prevents error if directory already exists
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    # The clock is read once per run, the timestamp and the displayed analysis date derive from it
+    analysis_started_at = datetime.datetime.now()
+    timestamp = analysis_started_at.strftime("%Y%m%d_%H%M%S")
 
     # Remove all file writing logic. Only print to console and keep data in memory.
     if verbose:
         print(f"# System Dynamics Model Analysis\n")
         print(f"**Problem Statement:** {problem_statement}\n")
-        print(f"**Analysis Date:** {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        print(f"**Analysis Date:** {analysis_started_at.strftime('%Y-%m-%d %H:%M:%S')}\n")
         print(f"--- Number of Requested Scenarios: {num_variations} ---\n")
 
     # Step 2: AI generates base model configuration
@@ -132,7 +213,8 @@ async def run_analysis(
         print("## Base Model Configuration Generation\n")
         print("Generating base model configuration with LLM...\n")
 
-    base_model_config = generate_model_config_with_llm(problem_statement, llm_for_generating_system_model, verbose=verbose)
+    # Model and scenario generation are blocking LLM calls, run them in a thread to keep the event loop responsive
+    base_model_config = await asyncio.to_thread(generate_model_config_with_llm, problem_statement, llm_for_generating_system_model, verbose=verbose)
 
     if base_model_config is None:
         if verbose:
@@ -141,13 +223,16 @@ async def run_analysis(
         return
 
     base_model_diagram = generate_model_diagram(base_model_config)
+    yield "", base_model_diagram
 
     if verbose:
         print("Base Model Configuration Generated Successfully.")
         print("Base Model Configuration Generated Successfully.\n")
+        base_model_config_json = orjson.dumps(base_model_config, option=orjson.OPT_INDENT_2).decode()
         print("### Base Model Configuration JSON:")
-        print(json.dumps(base_model_config, indent=2))
-        print("\n--- Base Model Configuration (JSON) ---\n", json.dumps(base_model_config, indent=2), "\n-------------------------------------------\n")
+        print(base_model_config_json)
+        print("\n--- Base Model Configuration (JSON) ---\n", base_model_config_json, "\n-------------------------------------------\n")
+    logging.debug("Base model configuration: %s", LazyJSON(base_model_config))
 
     all_scenarios_to_run = []
     all_scenarios_to_run.append({
@@ -155,82 +240,117 @@ async def run_analysis(
         "model_config": base_model_config
     })
 
-    # Step 3: Generate multiple parameter variations if requested
-    if num_variations > 1:
-        if verbose:
-            print("## Parameter Variation Generation\n")
-            print("Generating additional parameter variations with LLM...")
-            print(f"Requesting {num_variations - 1} additional parameter variations...\n")
-        additional_variations = generate_parameter_variations_with_llm(
-            base_model_config=base_model_config,
-            num_variations=(num_variations - 1),
-            problem_statement=problem_statement,
-            llm_for_generating_scenarios=llm_for_generating_scenarios,
-            verbose=verbose
-        )
+    # Variations only swap the parameters, so every scenario shares the base model's stocks
+    base_stock_names = tuple(s['name'] for s in base_model_config.get('stocks', []))
+    scenario_semaphore = asyncio.Semaphore(max_concurrency)
+    simulation_executor = _get_simulation_executor()
 
-        if not additional_variations:
+    async def run_scenario(scenario_description, model_config):
+        async with scenario_semaphore:
+            return await _run_scenario_simulation(
+                scenario_description, model_config, base_stock_names, problem_statement, verbose, simulation_executor
+            )
+
+    # Scenario tasks live in a task group: if the run fails part way (e.g. variation generation raises),
+    # the scenarios still in flight are cancelled instead of being left running. Each scenario catches its
+    # own simulation errors, so one failing scenario does not cancel the others
+    async with asyncio.TaskGroup() as scenario_group:
+        # The base case does not depend on the variations, so it is simulated while the LLM generates them
+        base_case_task = scenario_group.create_task(run_scenario("Base Case Scenario", base_model_config))
+
+        # Step 3: Generate multiple parameter variations if requested
+        if num_variations > 1:
             if verbose:
-                print("No additional parameter variations generated. Running only base case.")
-            logging.error("No additional parameter variations generated by LLM.")
-        else:
+                print("## Parameter Variation Generation\n")
+                print("Generating additional parameter variations with LLM...")
+                print(f"Requesting {num_variations - 1} additional parameter variations...\n")
+            additional_variations = await asyncio.to_thread(
+                generate_parameter_variations_with_llm,
+                base_model_config=base_model_config,
+                num_variations=(num_variations - 1),
+                problem_statement=problem_statement,
+                llm_for_generating_scenarios=llm_for_generating_scenarios,
+                verbose=verbose
+            )
+
+            if not additional_variations:
+                if verbose:
+                    print("No additional parameter variations generated. Running only base case.")
+                logging.error("No additional parameter variations generated by LLM.")
+            else:
+                if verbose:
+                    print(f"Successfully generated {len(additional_variations)} additional parameter variations.\n")
+                for var in additional_variations:
+                    # System only reads the config, so scenarios share the base structure and only swap the parameters
+                    scenario_config = {**base_model_config, 'parameters': var.parameters}
+                    all_scenarios_to_run.append({
+                        "scenario_description": var.scenario_description,
+                        "model_config": scenario_config
+                    })
+
+        if verbose:
+            print(f"--- Running {len(all_scenarios_to_run)} Scenarios ---\n")
+        all_individual_summaries = []
+
+        # Simulations run in the worker processes. Progress is reported as each scenario completes, but the
+        # summaries wait for all of them, since they are generated together in one fused LLM call (Step 5).
+        # Results are stored in scenario order
+        scenario_tasks = [base_case_task] + [
+            scenario_group.create_task(run_scenario(scenario['scenario_description'], scenario['model_config']))
+            for scenario in all_scenarios_to_run[1:]
+        ]
+        scenario_results = [None] * len(scenario_tasks)
+        completed_count = 0
+        async for index, result in _stream_scenarios(scenario_tasks):
+            scenario_results[index] = result
+            completed_count += 1
             if verbose:
-                print(f"Successfully generated {len(additional_variations)} additional parameter variations.\n")
-            for var in additional_variations:
-                scenario_config = copy.deepcopy(base_model_config)
-                scenario_config['parameters'] = var.parameters
-                all_scenarios_to_run.append({
-                    "scenario_description": var.scenario_description,
-                    "model_config": scenario_config
-                })
+                status = "simulated" if result["summary_data"] is not None else "failed"
+                print(f"Scenario {completed_count}/{len(scenario_tasks)} {status}: {result['scenario_description']}")
+
+    # Step 5: Summarize all successfully simulated scenarios, in a single fused LLM call when possible
+    simulated_scenarios = [result for result in scenario_results if result["summary_data"] is not None]
+    scenario_summaries = await asummarize_all_scenarios_with_llm(
+        problem_statement,
+        simulated_scenarios,
+        llm_for_simulation_analysis=llm_for_simulation_analysis,
+        verbose=verbose,
+        max_concurrency=max_concurrency
+    )
+    for result, summary_text in zip(simulated_scenarios, scenario_summaries):
+        result["summary_text"] = summary_text
 
-    if verbose:
-        print(f"--- Running {len(all_scenarios_to_run)} Scenarios ---\n")
-    all_individual_summaries = []
-    all_simulation_results = []
-
-    async def run_all_scenarios():
-        loop = asyncio.get_running_loop()
-        with ThreadPoolExecutor() as executor:
-            tasks = [
-                loop.run_in_executor(
-                    executor,
-                    _run_simulation_and_summarize,
-                    scenario['scenario_description'],
-                    scenario['model_config'],
-                    problem_statement,
-                    llm_for_simulation_analysis,
-                    verbose
-                )
-                for scenario in all_scenarios_to_run
-            ]
-            return await asyncio.gather(*tasks)
-
-    scenario_results = await run_all_scenarios()
     for result in scenario_results:
+        if verbose:
+            # Each scenario's report is written with one print instead of one per line
+            scenario_report = []
+            if result["summary_data"] is not None:
+                scenario_report += [
+                    f"\n--- AI Summary for Scenario: {result['scenario_description']} ---",
+                    result["summary_text"],
+                    "---------------------------------------------------\n",
+                    "### AI Generated Summary:",
+                    result["summary_text"] + "\n"
+                ]
+            scenario_report.append("---\n") # Separator between scenarios
+            print("\n".join(scenario_report))
         all_individual_summaries.append({
             "scenario_description": result["scenario_description"],
             "summary_text": result["summary_text"]
         })
-        if result["simulation_results"] is not None:
-            all_simulation_results.append({
-                "scenario_description": result["scenario_description"],
-                "simulation_results": result["simulation_results"]
-            })
-        if verbose:
-            print("---\n") # Separator between scenarios
 
     # Step 6: Generate final comprehensive summary if multiple variations were run
     final_summary = ""
     if verbose:
         print("# Final Comprehensive Analysis Conclusion\n")
     if num_variations > 1 and len(all_individual_summaries) > 1: # Only run if more than one successful scenario
-        final_summary = generate_final_summary_with_llm(
+        async for final_summary in astream_final_summary_with_llm(
             problem_statement,
             all_individual_summaries,
             llm_for_summarization=llm_for_summarization,
             verbose=verbose
-        )
+        ):
+            yield final_summary, base_model_diagram
         if verbose:
             print("\n--- Final Comprehensive AI Summary of All Scenarios ---")
             print(final_summary)
@@ -244,5 +364,35 @@ async def run_analysis(
         if verbose:
             print("\nNo successful scenarios to compare. Skipping final summary.")
             print("No successful scenarios were completed for comparison. Skipping final summary generation.\n")
+    if not final_summary:
+        yield final_summary, base_model_diagram
 
-    return final_summary, base_model_diagram
+async def run_analysis(
+        problem_statement: str,
+        num_variations: int = 1,
+        output_directory: str = "output",
+        llm_for_generating_system_model: dict = {},
+        llm_for_generating_scenarios: dict = {},
+        llm_for_simulation_analysis: dict = {},
+        llm_for_summarization: dict = {},
+        verbose: bool = False,
+        max_concurrency: int = MAX_CONCURRENT_SCENARIOS
+    ) -> tuple[str, str]:
+    """
+    Runs the entire analysis (see astream_analysis) and returns the complete (final_summary, model_diagram),
+    or None if the base model could not be generated.
+    """
+    result = None
+    async for result in astream_analysis(
+        problem_statement,
+        num_variations=num_variations,
+        output_directory=output_directory,
+        llm_for_generating_system_model=llm_for_generating_system_model,
+        llm_for_generating_scenarios=llm_for_generating_scenarios,
+        llm_for_simulation_analysis=llm_for_simulation_analysis,
+        llm_for_summarization=llm_for_summarization,
+        verbose=verbose,
+        max_concurrency=max_concurrency
+    ):
+        pass
+    return result
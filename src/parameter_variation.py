@@ -1,14 +1,16 @@
 # parameter_variation.py
 import json
+import orjson
 import yaml
 import os
 import logging
 from dotenv import load_dotenv
 # from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.utils.json import parse_json_markdown
 from pydantic import BaseModel, Field, ValidationError
-from src.utils import load_prompt_from_file, select_llm_model
+from src.utils import load_prompt_template, select_llm_model
+from src.llm_cache import cached_invoke
 
 # Configure logging
 os.makedirs('logs', exist_ok=True)
@@ -17,6 +19,23 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+_JSON_DECODER = json.JSONDecoder()
+_STR_OUTPUT_PARSER = StrOutputParser()
+
+def parse_llm_json_object(raw_llm_output):
+    """
+    Parses the JSON object in the LLM output in a single pass from its first '{', ignoring any text after it.
+    Output that does not decode cleanly (code fences, a truncated tail) goes through langchain's partial JSON parser.
+    """
+    json_start = raw_llm_output.find('{')
+    if json_start == -1:
+        raise ValueError("No valid JSON object found in LLM output.")
+    try:
+        parsed_data, _ = _JSON_DECODER.raw_decode(raw_llm_output, json_start)
+    except json.JSONDecodeError:
+        parsed_data = parse_json_markdown(raw_llm_output)
+    return parsed_data
+
 class ParameterVariation(BaseModel):
     scenario_description: str = Field(description="A brief, descriptive name or summary for this parameter variation scenario (e.g., 'Optimistic Productivity', 'High Investment Cost').")
     parameters: dict = Field(description="The dictionary of parameters for this specific variation. Only the 'value' of parameters should be changed, 'unit' must remain the same as the base model. Maintain the exact same parameter names as the base model.")
@@ -24,105 +43,95 @@ class ParameterVariation(BaseModel):
 class ParameterVariationsOutput(BaseModel):
     variations: list[ParameterVariation] = Field(description="A list of distinct parameter variations for different scenarios.")
 
-def generate_parameter_variations_with_llm(
-    base_model_config: dict,
-    num_variations: int,
-    problem_statement: str,
-    llm_for_generating_scenarios: dict = {'provider': 'google', 'model_name': 'gemini-2.0-flash', 'temperature': 0.5},
-    verbose: bool = False
-) -> list[ParameterVariation]: # Updated return type hint for clarity
-    """
-    Uses an LLM to generate multiple logical variations of model parameters.
-    """
-    llm = select_llm_model(llm_for_generating_scenarios)
-    raw_json_parser = StrOutputParser()
-
-    base_parameters = base_model_config.get('parameters', {})
-    base_params_str = json.dumps(base_parameters, indent=2)
-
-    example_json_output = json.dumps(
-        ParameterVariationsOutput(
-            variations=[
-                ParameterVariation(
-                    scenario_description='Example Scenario',
-                    parameters={
-                        'EXAMPLE_PARAM': {'value': 1.2, 'unit': 'ratio'}
-                    }
-                )
-            ]
-        ).model_dump(),
-        indent=2
-    )
-
-    # Load the prompt messages from the YAML file
-    prompt_directory = 'prompts'
-    if not os.path.exists(prompt_directory):
-        raise FileNotFoundError(f"Prompt directory not found: {prompt_directory}")
-    prompt_file = os.path.join(prompt_directory, 'parameter_variation_prompt.yaml')
-    prompt_messages = load_prompt_from_file(prompt_file)
-
-    prompt_template = ChatPromptTemplate.from_messages(
-        [
-            ("system", prompt_messages["system_message"]),
-            ("human", prompt_messages["human_message"])
+# The example output shown to the LLM never changes, so it is rendered once at import
+EXAMPLE_JSON_OUTPUT = orjson.dumps(
+    ParameterVariationsOutput(
+        variations=[
+            ParameterVariation(
+                scenario_description='Example Scenario',
+                parameters={
+                    'EXAMPLE_PARAM': {'value': 1.2, 'unit': 'ratio'}
+                }
+            )
         ]
-    )
+    ).model_dump(),
+    option=orjson.OPT_INDENT_2
+).decode()
 
-    chain = prompt_template | llm | raw_json_parser
+def _variation_inputs(base_model_config: dict, num_variations: int, problem_statement: str) -> dict:
+    """Prompt inputs for one parameter variation request."""
+    base_parameters = base_model_config.get('parameters', {})
+    return {
+        "problem_statement": problem_statement,
+        "base_params_str": orjson.dumps(base_parameters, option=orjson.OPT_INDENT_2).decode(),
+        "num_variations": num_variations,
+        "example_output_string": EXAMPLE_JSON_OUTPUT
+    }
 
+def _parse_variations_output(raw_llm_output: str, verbose: bool = False) -> list[ParameterVariation]:
+    """Parses and validates the raw LLM output, raising on malformed JSON or an invalid structure."""
     if verbose:
-        print(f"\nGenerating {num_variations} parameter variations with LLM... This might take a moment.")
-    raw_llm_output = ""
-    try:
-        raw_llm_output = chain.invoke({
-            "problem_statement": problem_statement,
-            "base_params_str": base_params_str,
-            "num_variations": num_variations,
-            "example_output_string": example_json_output
-        })
-        if verbose:
-            print("\nRaw LLM Output for Parameter Variations (for debugging):\n", raw_llm_output)
-        json_start = raw_llm_output.find('{')
-        json_end = raw_llm_output.rfind('}') + 1
+        print("\nRaw LLM Output for Parameter Variations (for debugging):\n", raw_llm_output)
+    parsed_data = parse_llm_json_object(raw_llm_output)
 
-        if json_start == -1 or json_end == -1:
-            raise ValueError("No valid JSON object found in LLM output.")
+    validated_output = ParameterVariationsOutput.model_validate(parsed_data) # Changed .parse_obj() to .model_validate()
 
-        json_string = raw_llm_output[json_start:json_end]
-        
-        parsed_data = json.loads(json_string)
+    if verbose:
+        print("\nParameter Variations Generated Successfully.")
+    return validated_output.variations
 
-        validated_output = ParameterVariationsOutput.model_validate(parsed_data) # Changed .parse_obj() to .model_validate()
-        
-        if verbose:
-            print("\nParameter Variations Generated Successfully.")
-        return validated_output.variations
-    except json.JSONDecodeError as e:
+def _handle_variation_error(e: Exception, raw_llm_output: str, verbose: bool = False) -> list:
+    """Reports a failed variation request and returns an empty list of variations."""
+    if isinstance(e, json.JSONDecodeError):
         if verbose:
             print(f"Error decoding JSON from LLM output: {e}")
-            print(f"Problematic JSON string: {json_string[:500]}...")
             print("Raw LLM output causing error:\n", raw_llm_output)
-        logger.error(f"Error decoding JSON from LLM output: {e}\nProblematic JSON string: {json_string[:500]}...\nRaw LLM output: {raw_llm_output}", exc_info=e)
-        return []
-    except ValidationError as e:
+        logger.error(f"Error decoding JSON from LLM output: {e}\nRaw LLM output: {raw_llm_output}", exc_info=e)
+    elif isinstance(e, ValidationError):
         if verbose:
             print(f"Pydantic validation error for LLM output: {e}")
             print("Raw LLM output causing error:\n", raw_llm_output)
         logger.error(f"Pydantic validation error for LLM output: {e}\nRaw LLM output: {raw_llm_output}", exc_info=e)
-        return []
-    except ValueError as e:
+    elif isinstance(e, ValueError):
         if verbose:
             print(f"Content error in LLM output: {e}")
             print("Raw LLM output causing error:\n", raw_llm_output)
         logger.error(f"Content error in LLM output: {e}\nRaw LLM output: {raw_llm_output}", exc_info=e)
-        return []
-    except Exception as e:
+    else:
         if verbose:
             print(f"An unexpected error occurred during parameter variation generation: {e}")
             print("Raw LLM output causing error:\n", raw_llm_output)
         logger.error(f"Unexpected error during parameter variation generation: {e}\nRaw LLM output: {raw_llm_output}", exc_info=e)
-        return []
+    return []
 
+def generate_parameter_variations_with_llm(
+    base_model_config: dict,
+    num_variations: int,
+    problem_statement: str,
+    llm_for_generating_scenarios: dict = {'provider': 'google', 'model_name': 'gemini-2.0-flash', 'temperature': 0.5},
+    verbose: bool = False,
+    cache: bool | None = None
+) -> list[ParameterVariation]: # Updated return type hint for clarity
+    """
+    Uses an LLM to generate multiple logical variations of model parameters.
+    Responses are cached on disk for low temperature configs; pass cache=True/False to override.
+    """
+    llm = select_llm_model(llm_for_generating_scenarios)
+    chain = load_prompt_template('parameter_variation_prompt.yaml') | llm | _STR_OUTPUT_PARSER
+
+    if verbose:
+        print(f"\nGenerating {num_variations} parameter variations with LLM... This might take a moment.")
+    raw_llm_output = ""
+    try:
+        raw_llm_output = cached_invoke(
+            chain,
+            _variation_inputs(base_model_config, num_variations, problem_statement),
+            llm_for_generating_scenarios,
+            cache=cache
+        )
+        return _parse_variations_output(raw_llm_output, verbose)
+    except Exception as e:
+        return _handle_variation_error(e, raw_llm_output, verbose)
 
 if __name__ == "__main__":
     print("--- Testing Parameter Variation Module ---")
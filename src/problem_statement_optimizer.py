@@ -1,43 +1,48 @@
-import os
 import logging
+import os
+from functools import lru_cache
 from dotenv import load_dotenv
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
 # from utils import load_prompt_from_file, select_llm_model
-from src.utils import load_prompt_from_file, select_llm_model
+from src.utils import PROMPT_DIRECTORY, _llm_settings, load_prompt_template, select_llm_model
 
 # Load environment variables (like GOOGLE_API_KEY)
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+_PROMPT_FILE_NAME = 'problem_statement_optimization_prompt.yaml'
+
+@lru_cache(maxsize=32)
+def _build_chain(provider, model_name, temperature, prompt_mtime):
+    # prompt_mtime is only part of the cache key, so editing the prompt file builds a chain from the new template
+    from langchain_core.output_parsers import StrOutputParser
+    prompt_template = load_prompt_template(_PROMPT_FILE_NAME)
+    llm = select_llm_model({'provider': provider, 'model_name': model_name, 'temperature': temperature})
+    # The chain is only invoked synchronously, so its client can be shared whichever event loop the caller runs in
+    return prompt_template | llm | StrOutputParser()
+
+def _get_chain(llm_config: dict):
+    """
+    Returns the prompt | llm | parser chain for the LLM config, built once per (provider, model_name, temperature)
+    and version of the prompt file, so repeated optimizations only invoke it.
+    """
+    prompt_file = os.path.join(PROMPT_DIRECTORY, _PROMPT_FILE_NAME)
+    try:
+        prompt_mtime = os.path.getmtime(prompt_file)
+    except OSError:
+        logger.error(f"Prompt file not found: {os.path.abspath(prompt_file)}")
+        raise FileNotFoundError(f"Prompt file not found: {os.path.abspath(prompt_file)}")
+    return _build_chain(*_llm_settings(llm_config), prompt_mtime)
 
 def optimize_problem_statement(problem_statement, llm_for_optimizing_problem_statement):
     """
     Optimizes the problem statement using an LLM to make it more suitable for model generation.
     """
-    llm = select_llm_model(llm_for_optimizing_problem_statement)
-    parser = StrOutputParser()
     if not problem_statement:
         logger.error("Problem statement cannot be empty.")
         raise ValueError("Problem statement cannot be empty.")
 
-    # Load the prompt messages from the YAML file
-    prompt_directory = 'prompts'
-    if not os.path.exists(prompt_directory):
-        logger.error(f"Prompt directory not found: {prompt_directory}")
-        raise FileNotFoundError(f"Prompt directory not found: {prompt_directory}")
-    prompt_file = os.path.join(prompt_directory, 'problem_statement_optimization_prompt.yaml')
-    prompt_messages = load_prompt_from_file(prompt_file)
-
-    prompt_template = ChatPromptTemplate.from_messages(
-        [
-            ("system", prompt_messages["system_message"]),
-            ("human", prompt_messages["human_message"])
-        ]
-    )
-
-    chain = prompt_template | llm | parser
+    chain = _get_chain(llm_for_optimizing_problem_statement)
 
     try:
         optimized_config = chain.invoke({"problem_statement": problem_statement})
@@ -2,11 +2,110 @@
 import pandas as pd
 import numpy as np
 import logging
+import math
 import os
+import ast
+import graphlib
+import functools
 
 # Do not configure logging here; use the root logger set up by orchestrator.py
 logger = logging.getLogger(__name__)
 
+# Supported integration methods of System.run_simulation
+INTEGRATION_METHODS = ('euler', 'rk4')
+# Rows added to the history buffer of System.run_simulation when the preallocated rows run out
+HISTORY_CHUNK_ROWS = 10_000
+
+# Builtins available to formulas (generated formulas are plain Python expressions): the pure functions and types,
+# everything but I/O, imports, introspection and code execution
+_FORMULA_BUILTINS = {
+    function.__name__: function
+    for function in (
+        min, max, abs, round, pow, divmod, sum, len, any, all, sorted, reversed, range, enumerate, zip, map, filter,
+        iter, next, isinstance, issubclass, callable, hash, repr, format, chr, ord, bin, oct, hex, ascii, type,
+        bool, int, float, complex, str, bytes, list, tuple, dict, set, frozenset, slice
+    )
+}
+
+# Functions that are pure functions of their arguments, formulas calling only these can be treated as constant
+_PURE_FUNCTIONS = frozenset(_FORMULA_BUILTINS) | {'exp', 'log', 'sqrt'}
+
+# Formulas are evaluated against this small namespace instead of the module globals, so name lookups that miss
+# the system state fall back to a handful of keys. It only keeps formulas away from the module's globals and from
+# builtins like open or __import__, it is not a sandbox: the math and np modules are exposed in full
+_FORMULA_GLOBALS = {
+    '__builtins__': _FORMULA_BUILTINS,
+    'exp': math.exp,
+    'log': math.log,
+    'sqrt': math.sqrt,
+    'math': math,
+    'np': np,
+}
+
+def _formula_names(formula: str) -> set:
+    """Returns the names referenced by a formula."""
+    return {node.id for node in ast.walk(ast.parse(formula, mode='eval')) if isinstance(node, ast.Name)}
+
+def _is_constant_formula(formula: str, varying_names: set) -> bool:
+    """
+    True if the formula references none of varying_names and only calls pure builtins,
+    so it evaluates to the same value at every time step of a run.
+    """
+    for node in ast.walk(ast.parse(formula, mode='eval')):
+        if isinstance(node, ast.Name) and node.id in varying_names:
+            return False
+        if isinstance(node, ast.Call) and not (isinstance(node.func, ast.Name) and node.func.id in _PURE_FUNCTIONS):
+            return False
+    return True
+
+def _flat_parameter_names(formulas, parameters: dict) -> set:
+    """
+    Returns the parameters that can be passed to formulas as plain values: dict parameters with a 'value'
+    that every formula references only as NAME['value'].
+    """
+    flat_names = {name for name, details in parameters.items() if isinstance(details, dict) and 'value' in details}
+    for formula in formulas:
+        tree = ast.parse(formula, mode='eval')
+        value_lookups = {id(node.value) for node in ast.walk(tree) if _is_value_lookup(node, flat_names)}
+        flat_names -= {node.id for node in ast.walk(tree) if isinstance(node, ast.Name) and id(node) not in value_lookups}
+    return flat_names
+
+def _is_value_lookup(node, parameter_names) -> bool:
+    """True for a NAME['value'] expression on one of parameter_names."""
+    return (
+        isinstance(node, ast.Subscript) and isinstance(node.ctx, ast.Load)
+        and isinstance(node.value, ast.Name) and node.value.id in parameter_names
+        and isinstance(node.slice, ast.Constant) and node.slice.value == 'value'
+    )
+
+class _FlattenParameters(ast.NodeTransformer):
+    """Rewrites NAME['value'] into NAME for the given parameter names."""
+    def __init__(self, parameter_names):
+        self.parameter_names = parameter_names
+
+    def visit_Subscript(self, node):
+        if _is_value_lookup(node, self.parameter_names):
+            return ast.copy_location(ast.Name(id=node.value.id, ctx=ast.Load()), node)
+        return self.generic_visit(node)
+
+def _compile_flat_formula(name: str, formula: str, flat_names: set):
+    """Compiles a formula with its NAME['value'] lookups of flat_names replaced by plain NAME references."""
+    tree = _FlattenParameters(flat_names).visit(ast.parse(formula, mode='eval'))
+    return compile(tree, f'<{name}>', 'eval')
+
+class _RenameNames(ast.NodeTransformer):
+    """Renames the names a formula reads according to a {name: new_name} mapping."""
+    def __init__(self, new_names):
+        self.new_names = new_names
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load) and node.id in self.new_names:
+            return ast.copy_location(ast.Name(id=self.new_names[node.id], ctx=ast.Load()), node)
+        return node
+
+# Formulas with nodes that bind names or open a scope of their own are not inlined into the fused step functions
+_NOT_INLINABLE_NODES = (ast.Lambda, ast.comprehension, ast.NamedExpr)
+
 class Stock:
     """Represents an accumulation in the system."""
     def __init__(self, name: str, initial_value: float, unit: str, description: str = ""):
@@ -17,13 +116,6 @@ class Stock:
         self.inflows = []
         self.outflows = []
 
-    def update(self, dt: float):
-        """Update the stock's value based on its net flows."""
-        net_flow = sum(flow.rate for flow in self.inflows) - \
-                   sum(flow.rate for flow in self.outflows)
-        self.value += net_flow * dt 
-        self.value = max(0.0, self.value) # Ensure non-negative stock values
-
     def __repr__(self):
         return f"Stock({self.name}={self.value:.2f} {self.unit})"
 
@@ -34,17 +126,24 @@ class Flow:
         self.formula = formula
         self.unit = unit
         self.description = description
+        # The formula is parsed once here, each time step only evaluates the compiled code object
+        try:
+            self.code = compile(formula, f'<{name}>', 'eval')
+        except SyntaxError as e:
+            logger.error(f"Error compiling flow '{name}' with formula '{formula}': {e}")
+            raise ValueError(f"Error compiling flow '{name}' with formula '{formula}': {e}")
         self.rate = 0.0
 
     def calculate_rate(self, system_state: dict):
         """
-        Calculate the flow rate using eval() on the formula string.
+        Calculate the flow rate using eval() on the compiled formula.
         The formula can reference stock values, auxiliary values, and parameters
         from the system_state dictionary.
         """
         try:
-            self.rate = eval(self.formula, globals(), system_state)
+            self.rate = eval(self.code, _FORMULA_GLOBALS, system_state)
             self.rate = max(0.0, self.rate) # Ensure non-negative flow rates
+            float(self.rate) # Rates are recorded as floats, a result that is not a real number (e.g. complex) fails here
         except Exception as e:
             logger.error(f"Error calculating flow '{self.name}' with formula '{self.formula}': {e}")
             raise ValueError(f"Error calculating flow '{self.name}' with formula '{self.formula}': {e}")
@@ -59,16 +158,23 @@ class Auxiliary:
         self.formula = formula
         self.unit = unit
         self.description = description
+        # The formula is parsed once here, each time step only evaluates the compiled code object
+        try:
+            self.code = compile(formula, f'<{name}>', 'eval')
+        except SyntaxError as e:
+            logger.error(f"Error compiling auxiliary '{name}' with formula '{formula}': {e}")
+            raise ValueError(f"Error compiling auxiliary '{name}' with formula '{formula}': {e}")
         self.value = 0.0
 
     def calculate_value(self, system_state: dict):
         """
-        Calculate the auxiliary's value using eval() on the formula string.
+        Calculate the auxiliary's value using eval() on the compiled formula.
         The formula can reference stock values, other auxiliary values,
         and parameters from the system_state dictionary.
         """
         try:
-            self.value = eval(self.formula, globals(), system_state)
+            self.value = eval(self.code, _FORMULA_GLOBALS, system_state)
+            float(self.value) # Values are recorded as floats, a result that is not a real number (complex, None) fails here
         except Exception as e:
             logger.error(f"Error calculating auxiliary '{self.name}' with formula '{self.formula}': {e}")
             raise ValueError(f"Error calculating auxiliary '{self.name}' with formula '{self.formula}': {e}")
@@ -141,54 +247,265 @@ class System:
                 logger.error(f"Invalid direction '{direction}' for flow connection. Must be 'inflow' or 'outflow'.")
                 raise ValueError(f"Invalid direction '{direction}' for flow connection. Must be 'inflow' or 'outflow'.")
 
-    def _get_current_dynamic_state_for_history(self):
+        # Auxiliaries are calculated once per time step, each after the auxiliaries its formula references
+        self._aux_order = self._order_auxiliaries()
+        # Formulas that depend only on parameters, numbers and constant auxiliaries keep their value for the whole run,
+        # they are calculated in the first time step only
+        varying_names = set(self.stocks) | set(self.flows) | {'time'}
+        self._constant_aux_names = set()
+        for aux in self._aux_order:
+            if _is_constant_formula(aux.formula, varying_names):
+                self._constant_aux_names.add(aux.name)
+            else:
+                varying_names.add(aux.name)
+        self._varying_aux_order = [aux for aux in self._aux_order if aux.name not in self._constant_aux_names]
+        self._all_flows = list(enumerate(self.flows.values()))
+        self._varying_flows = [(j, flow) for j, flow in self._all_flows if not _is_constant_formula(flow.formula, varying_names)]
+
+        # Formulas reference parameters as PARAM['value']. Parameters only used that way are passed to formulas as
+        # their plain value, with the lookups compiled away, so no dict is indexed per reference per time step.
+        # Old format (scalar) parameters are plain values already, any other use keeps the full parameter dict
+        formula_components = list(self.auxiliaries.values()) + list(self.flows.values())
+        flat_names = _flat_parameter_names([c.formula for c in formula_components], self.parameters)
+        self._flat_params = {
+            name: details['value'] if name in flat_names else details for name, details in self.parameters.items()
+        }
+        if flat_names:
+            for component in formula_components:
+                component.code = _compile_flat_formula(component.name, component.formula, flat_names)
+
+        # The context formulas are evaluated in is kept across time steps, and only the changed entries are written.
+        # Parameters never change during a run, so they are added once
+        self._eval_context = dict(self._flat_params)
+        # Values of the auxiliaries as their formulas returned them, for the fused step functions
+        self._aux_state = [aux.value for aux in self.auxiliaries.values()]
+
+        # Structure of arrays: during a run the state lives in NumPy arrays indexed by component position,
+        # the Stock, Auxiliary and Flow objects keep the formulas and metadata
+        self._stock_names = list(self.stocks)
+        self._auxiliary_names = list(self.auxiliaries)
+        self._flow_names = list(self.flows)
+        # Flow connections as index arrays: connection k moves flow_rates[flow_idx[k]] into (or out of) stock stock_idx[k].
+        # Each stock's inflows and outflows are summed in connection order by np.bincount, in one vectorized call
+        flow_positions = {name: j for j, name in enumerate(self._flow_names)}
+        inflow_pairs = [(i, flow_positions[flow.name]) for i, stock in enumerate(self.stocks.values()) for flow in stock.inflows]
+        outflow_pairs = [(i, flow_positions[flow.name]) for i, stock in enumerate(self.stocks.values()) for flow in stock.outflows]
+        self._inflow_stock_idx, self._inflow_flow_idx = np.array(inflow_pairs, dtype=np.intp).reshape(-1, 2).T
+        self._outflow_stock_idx, self._outflow_flow_idx = np.array(outflow_pairs, dtype=np.intp).reshape(-1, 2).T
+
+        # Step functions (stock_values, time, aux_values, flow_rates) -> net flows, for the first time step and the later
+        # ones. The fused functions evaluate all formulas inline in one call, evaluating formula by formula
+        # (_calculate_net_flows) remains for formulas that cannot be inlined and to report errors
+        reference_steps = (
+            functools.partial(self._calculate_net_flows, aux_to_calculate=self._aux_order, flows_to_calculate=self._all_flows),
+            functools.partial(self._calculate_net_flows, aux_to_calculate=self._varying_aux_order, flows_to_calculate=self._varying_flows)
+        )
+        fused_steps = self._compile_fused_steps(flat_names)
+        if fused_steps is None:
+            self._first_step, self._step = reference_steps
+        else:
+            self._first_step, self._step = (
+                functools.partial(self._run_fused_step, fused_step, reference_step)
+                for fused_step, reference_step in zip(fused_steps, reference_steps)
+            )
+
+    def _order_auxiliaries(self):
         """
-        Returns a dictionary of current values for stocks, auxiliaries, and flows
-        to be recorded in the simulation history DataFrame.
+        Returns the auxiliaries in dependency (topological) order, found from the names in their formulas.
+        Raises ValueError if auxiliaries depend on each other in a cycle.
         """
-        state_record = {name: stock.value for name, stock in self.stocks.items()}
-        state_record.update({name: aux.value for name, aux in self.auxiliaries.items()})
-        state_record.update({name: flow.rate for name, flow in self.flows.items()})
-        state_record['time'] = self.time # Include time for the DataFrame
-        return state_record
+        dependencies = {}
+        for aux_name, aux in self.auxiliaries.items():
+            dependencies[aux_name] = _formula_names(aux.formula) & self.auxiliaries.keys()
+        try:
+            return [self.auxiliaries[aux_name] for aux_name in graphlib.TopologicalSorter(dependencies).static_order()]
+        except graphlib.CycleError as e:
+            cycle = " -> ".join(e.args[1])
+            logger.error(f"Circular dependency between auxiliaries: {cycle}")
+            raise ValueError(f"Circular dependency between auxiliaries: {cycle}")
+
+    def _compile_fused_steps(self, flat_names):
+        """
+        Generates and compiles one Python function per formula set (every formula for the first time step, the varying
+        ones afterwards) that evaluates the auxiliaries in dependency order and then the flows with the formulas
+        inlined, and returns the net flow into each stock, like _calculate_net_flows.
+        Returns the (first step, later steps) functions, or None if a formula cannot be inlined.
+        """
+        formula_trees = {}
+        for component in list(self.auxiliaries.values()) + list(self.flows.values()):
+            tree = _FlattenParameters(flat_names).visit(ast.parse(component.formula, mode='eval'))
+            if any(isinstance(node, _NOT_INLINABLE_NODES) for node in ast.walk(tree)):
+                return None
+            formula_trees[component.name] = tree
+
+        # Formula names become locals of the step function, later entries win as in the evaluation context.
+        # Generated names start with a double underscore, so they do not capture names formulas leave to the globals
+        namespace = dict(_FORMULA_GLOBALS, __aux_state=self._aux_state, __array=np.array)
+        local_names = {}
+        for n, (name, value) in enumerate(self._flat_params.items()):
+            local_names[name] = f'__p{n}'
+            namespace[f'__p{n}'] = value
+        local_names.update({name: f'__s{i}' for i, name in enumerate(self._stock_names)})
+        local_names.update({name: f'__f{j}' for j, name in enumerate(self._flow_names)})
+        local_names['time'] = '__time'
+        local_names.update({name: f'__a{k}' for k, name in enumerate(self._auxiliary_names)})
+        renamer = _RenameNames(local_names)
+        expressions = {name: ast.unparse(renamer.visit(tree)) for name, tree in formula_trees.items()}
+
+        aux_positions = {name: k for k, name in enumerate(self._auxiliary_names)}
+        flow_positions = {name: j for j, name in enumerate(self._flow_names)}
+        # Each stock's inflows and outflows are summed in connection order starting from 0.0, as np.bincount does
+        net_flows = [
+            f"(0.0{''.join(f' + __r{flow_positions[flow.name]}' for flow in stock.inflows)})"
+            f" - (0.0{''.join(f' + __r{flow_positions[flow.name]}' for flow in stock.outflows)})"
+            for stock in self.stocks.values()
+        ]
+        source = []
+        for function_name, aux_to_calculate, flows_to_calculate in (
+            ('__first_step', self._aux_order, self._all_flows), ('__step', self._varying_aux_order, self._varying_flows)
+        ):
+            source.append(f"def {function_name}(__stock_values, __time, __aux_values, __flow_rates):")
+            source.append(f"    [{', '.join(f'__s{i}' for i in range(len(self._stock_names)))}] = __stock_values.tolist()")
+            # Flows see the previous rates
+            source.append(f"    [{', '.join(f'__f{j}' for j in range(len(self._flow_names)))}] = __flow_rates.tolist()")
+            calculated_names = {aux.name for aux in aux_to_calculate}
+            for k, name in enumerate(self._auxiliary_names):
+                if name not in calculated_names:
+                    source.append(f"    __a{k} = __aux_state[{k}]")
+            for aux in aux_to_calculate:
+                k = aux_positions[aux.name]
+                source.append(f"    __a{k} = {expressions[aux.name]}")
+                source.append(f"    __aux_state[{k}] = __a{k}")
+            source.append("    __aux_values[:] = __aux_state")
+            for j, flow in flows_to_calculate:
+                source.append(f"    __flow_rates[{j}] = max(0.0, {expressions[flow.name]})") # Ensure non-negative flow rates
+            source.append(f"    [{', '.join(f'__r{j}' for j in range(len(self._flow_names)))}] = __flow_rates.tolist()")
+            source.append(f"    return __array([{', '.join(net_flows)}])")
+        exec(compile("\n".join(source), '<fused step>', 'exec'), namespace)
+        return namespace['__first_step'], namespace['__step']
+
+    def _run_fused_step(self, fused_step, reference_step, stock_values, time, aux_values, flow_rates):
+        """Runs a fused step function, on an error the formulas are evaluated one by one to report the failing one."""
+        try:
+            return fused_step(stock_values, time, aux_values, flow_rates)
+        except Exception as e:
+            self._eval_context.update(zip(self._auxiliary_names, self._aux_state))
+            reference_step(stock_values, time, aux_values, flow_rates)
+            # Formula by formula evaluation did not fail, the error still surfaces as a calculation error
+            logger.error(f"Error calculating time step at time {time}: {e}")
+            raise ValueError(f"Error calculating time step at time {time}: {e}") from e
+
+    def _calculate_net_flows(self, stock_values, time, aux_values, flow_rates, aux_to_calculate, flows_to_calculate):
+        """
+        Calculates the auxiliaries and flows for the given stock values and time, writing them into
+        aux_values and flow_rates, and returns the net flow into each stock.
+        """
+        # Refresh the context for formula evaluation (for Auxiliaries and Flows) with this state.
+        # Values go in as Python floats, so formulas behave exactly as with plain numbers.
+        # Auxiliaries are written as they are calculated, constant ones keep the value of the first step
+        eval_context = self._eval_context
+        eval_context.update(zip(self._stock_names, stock_values.tolist()))
+        eval_context.update(zip(self._flow_names, flow_rates.tolist())) # Flows see the previous rates
+        eval_context['time'] = time # Include time in eval context
+
+        # Calculate Auxiliaries once each, in dependency order, so every formula sees up to date values
+        for aux in aux_to_calculate:
+            aux.calculate_value(eval_context)
+            # IMMEDIATELY update eval_context with the new auxiliary value, auxiliaries later in the order use it
+            eval_context[aux.name] = aux.value
+        for i, aux in enumerate(self.auxiliaries.values()):
+            aux_values[i] = aux.value
+
+        # Calculate Flows using the now fully updated eval_context
+        for j, flow in flows_to_calculate:
+            flow.calculate_rate(eval_context)
+            flow_rates[j] = flow.rate
 
-    def run_simulation(self, end_time: float):
-        """Runs the simulation from current time to end_time."""
-        self.history = pd.DataFrame() # Ensure history is reset for each run
+        return (
+            np.bincount(self._inflow_stock_idx, weights=flow_rates[self._inflow_flow_idx], minlength=len(stock_values))
+            - np.bincount(self._outflow_stock_idx, weights=flow_rates[self._outflow_flow_idx], minlength=len(stock_values))
+        )
+
+    def _rk4_net_flows(self, stock_values, k1, aux_values, flow_rates, step):
+        """
+        Returns the classic fourth order Runge-Kutta slope (k1 + 2*k2 + 2*k3 + k4) / 6 for the step from stock_values,
+        given k1, the net flows at the start of the step. Intermediate states are kept non-negative like the stocks,
+        and their auxiliaries and flows are not recorded. step is the step function of the current time step.
+        """
+        half_dt = self.dt / 2
+        stage_aux_values, stage_flow_rates = aux_values.copy(), flow_rates.copy()
+        k2 = step(np.maximum(stock_values + half_dt * k1, 0.0), self.time + half_dt, stage_aux_values, stage_flow_rates)
+        k3 = step(np.maximum(stock_values + half_dt * k2, 0.0), self.time + half_dt, stage_aux_values, stage_flow_rates)
+        k4 = step(np.maximum(stock_values + self.dt * k3, 0.0), self.time + self.dt, stage_aux_values, stage_flow_rates)
+        return (k1 + 2 * k2 + 2 * k3 + k4) / 6
+
+    def run_simulation(self, end_time: float, method: str = 'euler'):
+        """
+        Runs the simulation from current time to end_time.
+        method is 'euler' (forward Euler, the default) or 'rk4' (fourth order Runge-Kutta), which is far more
+        accurate for the same dt, so a model can use a larger dt for the same error at four evaluations per step.
+        """
+        if method not in INTEGRATION_METHODS:
+            logger.error(f"Invalid integration method '{method}'. Must be one of {', '.join(INTEGRATION_METHODS)}.")
+            raise ValueError(f"Invalid integration method '{method}'. Must be one of {', '.join(INTEGRATION_METHODS)}.")
+        stock_values = np.array([stock.value for stock in self.stocks.values()], dtype=float)
+        aux_values = np.array([aux.value for aux in self.auxiliaries.values()], dtype=float)
+        flow_rates = np.array([flow.rate for flow in self.flows.values()], dtype=float)
+        # History rows are written into a preallocated buffer, turned into the history DataFrame once after the loop.
+        # One spare row covers the float accumulation of time, if that still is not enough the buffer grows by
+        # HISTORY_CHUNK_ROWS rows at a time, rather than doubling a possibly large buffer for a few extra rows
+        history_columns = self._stock_names + self._auxiliary_names + self._flow_names + ['time']
+        aux_start, flow_start = len(self._stock_names), len(self._stock_names) + len(self._auxiliary_names)
+        history_buffer = np.empty((max(math.floor((end_time - self.time) / self.dt) + 2, 1), len(history_columns)))
+        recorded_steps = 0
+        step = self._first_step
+        self._eval_context.update(zip(self._auxiliary_names, aux_values.tolist()))
+        self._aux_state[:] = aux_values.tolist()
 
         while self.time <= end_time:
             # 1. Record the current dynamic state for the history DataFrame *before* updates
-            current_state_record_for_history = self._get_current_dynamic_state_for_history()
-            self.history = pd.concat([self.history, pd.DataFrame([current_state_record_for_history])], ignore_index=True)
-
-            # 2. Prepare the context for formula evaluation (for Auxiliaries and Flows)
-            eval_context = {name: stock.value for name, stock in self.stocks.items()}
-            # Auxiliaries are initialized to 0.0, so update eval_context with their current (potentially 0.0) values
-            # before calculating them. This ensures their names are in the context.
-            eval_context.update({name: aux.value for name, aux in self.auxiliaries.items()})
-            eval_context.update({name: flow.rate for name, flow in self.flows.items()}) # Include current flow rates
-            eval_context.update(self.parameters) # Include full parameter dictionaries
-            eval_context['time'] = self.time # Include time in eval context
-
-            # Calculate Auxiliaries using the eval_context in multiple passes
-            # This helps resolve dependencies where one auxiliary depends on another.
-            # TO IMPROVE: This is not a good logic and will need to be improved in future iterations.
-            for _ in range(5): # Iterate 5 times to ensure dependencies are met in typical models
-                for aux_name, aux in self.auxiliaries.items():
-                    aux.calculate_value(eval_context)
-                    # IMMEDIATELY update eval_context with the new auxiliary value
-                    # This is crucial for auxiliaries calculated later in the same pass
-                    eval_context[aux_name] = aux.value
-
-            # 5. Calculate Flows using the now fully updated eval_context
-            for flow_name, flow in self.flows.items():
-                flow.calculate_rate(eval_context)
-
-            # 6. Update Stocks based on calculated flows
-            for stock_name, stock in self.stocks.items():
-                stock.update(self.dt)
-
-            # 7. Advance time
+            if recorded_steps == len(history_buffer):
+                history_buffer = np.concatenate((history_buffer, np.empty((HISTORY_CHUNK_ROWS, len(history_columns)))))
+            history_row = history_buffer[recorded_steps]
+            history_row[:aux_start] = stock_values
+            history_row[aux_start:flow_start] = aux_values
+            history_row[flow_start:-1] = flow_rates
+            history_row[-1] = self.time # Include time for the DataFrame
+            recorded_steps += 1
+
+            # 2. Calculate Auxiliaries and Flows for the current state
+            net_flows = step(stock_values, self.time, aux_values, flow_rates)
+            if method == 'rk4':
+                net_flows = self._rk4_net_flows(stock_values, net_flows, aux_values, flow_rates, step)
+
+            # After the first step, only the formulas that depend on the simulation state are calculated again
+            step = self._step
+
+            # 3. Update Stocks based on calculated flows, keeping them non-negative
+            stock_values += net_flows * self.dt
+            np.maximum(stock_values, 0.0, out=stock_values)
+
+            # 4. Advance time
             self.time += self.dt
 
-        return self.history
\ No newline at end of file
+        # The Stock, Auxiliary and Flow objects reflect the final state, as after a step by step run
+        for stock, value in zip(self.stocks.values(), stock_values.tolist()):
+            stock.value = value
+        for aux, value in zip(self.auxiliaries.values(), aux_values.tolist()):
+            aux.value = value
+        for flow, rate in zip(self.flows.values(), flow_rates.tolist()):
+            flow.rate = rate
+        self.history = pd.DataFrame(history_buffer[:recorded_steps], columns=history_columns)
+        return self.history
+
+def simulate_model(model_config: dict, method: str = 'euler'):
+    """
+    Builds the System for a model configuration and runs it to the configured end time with the given
+    integration method (see System.run_simulation).
+    Returns (history, parameters, component_units). Lives at module level so it can be sent to worker
+    processes, and only returns plain data since the System itself holds compiled formulas.
+    """
+    sim_system = System(model_config)
+    end_time_value = model_config.get('simulation_settings', {}).get('end_time', {}).get('value', 100)
+    simulation_results = sim_system.run_simulation(end_time=end_time_value, method=method)
+    return simulation_results, sim_system.parameters, sim_system.component_units
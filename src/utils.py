@@ -1,8 +1,8 @@
 import os
 import yaml
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
+import asyncio
+import weakref
+from functools import lru_cache
 
 
 # Load prompt templates from files
@@ -10,7 +10,7 @@ def load_prompt_from_file(filepath):
     """Loads prompt messages from a YAML file."""
     # from prompts folder
     if not os.path.exists(filepath):
-        raise FileNotFoundError(f"Prompt file not found: {filepath}")   
+        raise FileNotFoundError(f"Prompt file not found: {filepath}")
     if not filepath.endswith('.yaml'):
         raise ValueError("Prompt file must be a YAML file.")
     # Load the YAML file
@@ -18,18 +18,76 @@ def load_prompt_from_file(filepath):
         prompt_data = yaml.safe_load(f)
     return prompt_data
 
-def select_llm_model(llm_config):
-    """Selects the appropriate LLM model based on the model name."""
-    provider = llm_config.get("provider", "google")
-    model_name = llm_config.get("model_name", "gemini-2.0-flash")
-    temperature = llm_config.get("temperature", 0.2)
+PROMPT_DIRECTORY = 'prompts'
+
+def load_prompt_template(prompt_file_name):
+    """
+    Returns the ChatPromptTemplate for a YAML file in the prompts directory (its system_message and human_message).
+    Templates are shared, and built again only when the file changed.
+    """
+    prompt_file = os.path.abspath(os.path.join(PROMPT_DIRECTORY, prompt_file_name))
+    # A single stat both checks that the file exists and gives the mtime for the cache key
+    try:
+        mtime = os.path.getmtime(prompt_file)
+    except OSError:
+        raise FileNotFoundError(f"Prompt file not found: {prompt_file}")
+    return _load_prompt_template(prompt_file, mtime)
+
+@lru_cache(maxsize=32)
+def _load_prompt_template(prompt_file, mtime):
+    # mtime is part of the cache key, so editing the prompt file invalidates the cached template.
+    # LangChain is imported on first use, importing this module does not load it
+    from langchain_core.prompts import ChatPromptTemplate
+    prompt_messages = load_prompt_from_file(prompt_file)
+    return ChatPromptTemplate.from_messages(
+        [
+            ("system", prompt_messages["system_message"]),
+            ("human", prompt_messages["human_message"])
+        ]
+    )
+
+# LLM clients keep async connections bound to the event loop that created them, so instances are memoized per loop
+_llm_models_by_loop = weakref.WeakKeyDictionary()
 
+def _llm_settings(llm_config):
+    """Returns the (provider, model_name, temperature) a config selects, with defaults filled in."""
+    return (
+        llm_config.get("provider", "google"),
+        llm_config.get("model_name", "gemini-2.0-flash"),
+        llm_config.get("temperature", 0.2)
+    )
+
+def _create_llm_model(provider, model_name, temperature):
+    # Provider SDKs are imported on first use, so only the selected provider's dependencies are loaded
     if provider == "openai":
+        from langchain_openai import ChatOpenAI
         llm = ChatOpenAI(model=model_name, temperature=temperature)
     elif provider == "google":
+        from langchain_google_genai import ChatGoogleGenerativeAI
         llm = ChatGoogleGenerativeAI(model=model_name, temperature=temperature)
     elif provider == "anthropic":
+        from langchain_anthropic import ChatAnthropic
         llm = ChatAnthropic(model_name=model_name, temperature=temperature, timeout=60, stop=[])
     else:
         raise ValueError(f"Unsupported provider: {provider}. Supported providers are: openai, google, anthropic.")
     return llm
+
+@lru_cache(maxsize=32)
+def _select_llm_model_cached(provider, model_name, temperature):
+    """Clients for callers outside an event loop (sync code and worker threads), built once per settings."""
+    return _create_llm_model(provider, model_name, temperature)
+
+def select_llm_model(llm_config):
+    """
+    Selects the appropriate LLM model based on the model name.
+    Returns a shared instance per (provider, model_name, temperature), so every call reuses the same client
+    and its connection pool.
+    """
+    settings = _llm_settings(llm_config)
+    try:
+        llm_models = _llm_models_by_loop.setdefault(asyncio.get_running_loop(), {})
+    except RuntimeError:
+        return _select_llm_model_cached(*settings)
+    if settings not in llm_models:
+        llm_models[settings] = _create_llm_model(*settings)
+    return llm_models[settings]